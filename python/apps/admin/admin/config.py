@@ -19,6 +19,13 @@ MONGODB_DATABASE = os.getenv("DATABASE_NAME")
 MONGODB_REPLICASET = "rs0"
 MONGODB_REFERENCE_MANAGER_COLLECTION = "referencemanager"
 
+# Build models out of documents read from the database without validating
+# them again. Documents are only ever written out of validated models
+TRUSTED_READS = True if os.getenv("TRUSTED_READS", "true") == "true" else False
+
+# Documents fetched per round trip, when streaming a listing
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 100))
+
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", None)
 ALGORITHM = os.environ.get("ALGORITHM", None)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
@@ -1,17 +1,21 @@
 from abc import ABC, abstractmethod
 import datetime
 import hashlib
-from typing import List
+from typing import AsyncIterator, List, Optional
 from uuid import uuid4
 
 from motor.motor_asyncio import (
 	AsyncIOMotorClient,
 	AsyncIOMotorClientSession,
+	AsyncIOMotorCollection,
+	AsyncIOMotorCursor,
 )
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 from passlib.hash import bcrypt
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
 
 from contextlog import contextlog
+from mongoindexes import ensure_indexes, get_projection, hydrate
 from admin import config
 from admin.exceptions import (
 	DatabaseConnectionError,
@@ -32,6 +36,13 @@ from admin.models.db_models import (
 
 logger = contextlog.get_contextlog()
 
+
+# Server side projections of the models read from the database
+REFERENCE_PROJECTION = get_projection(Reference)
+INTERNAL_USER_PROJECTION = get_projection(InternalUser)
+ADMIN_USER_PROJECTION = get_projection(AdminUser)
+
+
 def get_db_client(db_type):
 	""" Works out the correct database client based on
 		the database type provided in the configuration
@@ -86,6 +97,18 @@ class DatabaseClient(ABC):
 		""" Ends a session in the database. """
 		...
 
+	@abstractmethod
+	async def create_indexes(self):
+		""" Creates the indexes that the queries of the service rely on.
+
+			Called once at the start of the service. Safe to call
+			from more than one replica at the same time.
+
+			Raises:
+				admin.exception.DatabaseConnectionError
+		"""
+		...
+
 	@abstractmethod
 	async def get_operator(self, username: str, password: str) -> AdminUser:
 		""" Searches for an admin user in the database """
@@ -97,8 +120,30 @@ class DatabaseClient(ABC):
 		...
 
 	@abstractmethod
-	async def get_users(self, requested_join: int, is_author: int) -> List[InternalUser]:
-		""" Searches for regular users in the database """
+	def get_users(
+		self,
+		requested_join: int,
+		is_author: int,
+		sort_by: Optional[str] = None,
+		descending: bool = False,
+		skip: int = 0,
+		limit: int = 0,
+	) -> AsyncIterator[dict]:
+		""" Searches for regular users in the database
+
+			Users are read in batches, as they are iterated.
+
+			Args:
+				requested_join: One of FilterOptions, or None for all
+				is_author: One of FilterOptions, or None for all
+				sort_by: The field to sort by. Ties are sorted by id
+				descending: Whether to sort in descending order
+				skip: Number of users to skip
+				limit: Maximum number of users to return, 0 for all
+
+			Returns:
+				users: An async iterator of user documents
+		"""
 		...
 
 	@abstractmethod
@@ -119,17 +164,62 @@ class DatabaseClient(ABC):
 		...
 
 	@abstractmethod
-	async def get_references(
+	def get_references(
 		self,
-		has_amazon_links: bool,
-		has_waterstones_links: bool,
-		has_bookdepository_links: bool,
-	) -> List[Reference]:
-		""" Searches for references in the database """
+		has_amazon_links: int,
+		has_waterstones_links: int,
+		has_bookdepository_links: int,
+		sort_by: Optional[str] = None,
+		descending: bool = False,
+		skip: int = 0,
+		limit: int = 0,
+	) -> AsyncIterator[dict]:
+		""" Searches for references in the database
+
+			References are read in batches, as they are iterated.
+
+			Args:
+				has_amazon_links: One of FilterOptions, or None for all
+				has_waterstones_links: One of FilterOptions, or None for all
+				has_bookdepository_links: One of FilterOptions, or None for all
+				sort_by: The field to sort by. Ties are sorted by id
+				descending: Whether to sort in descending order
+				skip: Number of references to skip
+				limit: Maximum number of references to return, 0 for all
+
+			Returns:
+				references: An async iterator of reference documents
+		"""
 		...
 
+	@abstractmethod
 	async def update_reference_link(self, reference_id: str, book_name: str, link_type: str, link_url: str) -> int:
-		""" Updates the link of a specific book for a given reference """
+		""" Updates the link of a specific book for a given reference.
+
+			The link is added when the book has no link of that type,
+			replaced when it has one and removed when link_url is empty.
+
+			Args:
+				reference_id: The unique id of the reference
+				book_name: The name of the book in the reference
+				link_type: The type of the link
+				link_url: The new url of the link, or an empty string
+
+			Returns:
+				modified_count: Number of links changed, 0 or 1
+		"""
+		...
+
+	@abstractmethod
+	async def update_reference_links(self, links: List[dict]) -> int:
+		""" Updates many links, as per update_reference_link, in one call.
+
+			Args:
+				links: Dicts with the arguments of update_reference_link
+
+			Returns:
+				modified_count: Number of links changed
+		"""
 		...
 
 	@abstractmethod
@@ -225,6 +315,19 @@ class MongoDBClient(DatabaseClient):
 		logger.info("Ending MongoDB session")
 		await self._session.end_session()
 
+	async def create_indexes(self):
+		logger.info("Creating MongoDB indexes")
+		try:
+			version = await ensure_indexes(self._db)
+		except ServerSelectionTimeoutError as exc:
+			raise DatabaseConnectionError(exc)
+		except OperationFailure as exc:
+			# Served with the indexes of the previous version until resolved
+			logger.error(f"Failed to create MongoDB indexes: {exc}")
+			return
+
+		logger.info(f"MongoDB indexes at version {version}")
+
 	async def get_operator(self, username: str, password: str) -> AdminUser:
 		admin_user = None
 
@@ -232,7 +335,7 @@ class MongoDBClient(DatabaseClient):
 		mongo_user = await self._operators_coll.find_one({
 			"username": username,
 			"password": encrypted_password
-		})
+		}, ADMIN_USER_PROJECTION)
 
 		if mongo_user:
 			admin_user = AdminUser(
@@ -244,7 +347,9 @@ class MongoDBClient(DatabaseClient):
 
 	async def get_operator_by_username(self, username: str) -> AdminUser:
 		admin_user = None
-		mongo_user = await self._operators_coll.find_one({"username": username})
+		mongo_user = await self._operators_coll.find_one(
+			{"username": username}, ADMIN_USER_PROJECTION
+		)
 
 		if mongo_user:
 			admin_user = AdminUser(
@@ -254,7 +359,15 @@ class MongoDBClient(DatabaseClient):
 
 		return admin_user
 
-	async def get_users(self, requested_join: int, is_author: int) -> List[dict]:
+	async def get_users(
+		self,
+		requested_join: int,
+		is_author: int,
+		sort_by: Optional[str] = None,
+		descending: bool = False,
+		skip: int = 0,
+		limit: int = 0,
+	) -> AsyncIterator[dict]:
 		requested_join_filter = {}
 		if requested_join == 1:
 			requested_join_filter["requested_join"] = True
@@ -280,39 +393,20 @@ class MongoDBClient(DatabaseClient):
 		else:
 			filters = {}
 
-		users = []
-		async for mongo_user in self._users_coll.find(filters):
-			users.append(
-				InternalUser(
-					internal_sub_id=mongo_user["internal_sub_id"],
-					external_sub_id=mongo_user["external_sub_id"],
-					username=mongo_user["username"],
-					is_author=mongo_user["is_author"],
-					requested_join=mongo_user["requested_join"],
-					bookmarked_references=mongo_user["bookmarked_references"],
-					rated_references=mongo_user["rated_references"],
-					created_at=mongo_user["created_at"],
-				)
-			)
+		cursor = self._find_sorted(self._users_coll, filters, INTERNAL_USER_PROJECTION, sort_by, descending)
 
-		return users
+		async for mongo_user in cursor.skip(skip).limit(limit):
+			yield mongo_user
 
 	async def get_user_by_id(self, internal_sub_id: str) -> InternalUser:
 		internal_user = None
 
-		mongo_user = await self._users_coll.find_one({'internal_sub_id': internal_sub_id})
+		mongo_user = await self._users_coll.find_one(
+			{'internal_sub_id': internal_sub_id}, INTERNAL_USER_PROJECTION
+		)
 
 		if mongo_user:
-			internal_user = InternalUser(
-				internal_sub_id=mongo_user["internal_sub_id"],
-				external_sub_id=mongo_user["external_sub_id"],
-				username=mongo_user["username"],
-				is_author=mongo_user["is_author"],
-				requested_join=mongo_user["requested_join"],
-				bookmarked_references=mongo_user["bookmarked_references"],
-				rated_references=mongo_user["rated_references"],
-				created_at=mongo_user["created_at"],
-			)
+			internal_user = hydrate(InternalUser, mongo_user, config.TRUSTED_READS)
 		else:
 			raise UserDoesNotExist(f"User {internal_sub_id} does not exist")
 
@@ -336,12 +430,12 @@ class MongoDBClient(DatabaseClient):
 
 	async def get_reference_by_id(self, reference_id: str) -> Reference:
 		reference = None
-		reference_doc = await self._reference_manager_coll.find_one({"_id": reference_id})
+		reference_doc = await self._reference_manager_coll.find_one(
+			{"_id": reference_id}, REFERENCE_PROJECTION
+		)
 
 		if reference_doc:
-			del reference_doc["metadata"]
-			del reference_doc["_id"]
-			reference = Reference(**reference_doc)
+			reference = hydrate(Reference, reference_doc, config.TRUSTED_READS)
 
 		return reference
 
@@ -350,7 +444,11 @@ class MongoDBClient(DatabaseClient):
 		has_amazon_links: int,
 		has_waterstones_links: int,
 		has_bookdepository_links: int,
-	) -> List[Reference]:
+		sort_by: Optional[str] = None,
+		descending: bool = False,
+		skip: int = 0,
+		limit: int = 0,
+	) -> AsyncIterator[dict]:
 
 		amazon_filter = {}
 		if has_amazon_links == 1:
@@ -385,45 +483,128 @@ class MongoDBClient(DatabaseClient):
 		else:
 			filters = {}
 
-		references = []
-		async for document in self._reference_manager_coll.find(filters):
-			# Clear DB specific data
-			del document["metadata"]
-			del document["_id"]
-			references.append(Reference(**document))
+		cursor = self._find_sorted(
+			self._reference_manager_coll, filters, REFERENCE_PROJECTION, sort_by, descending
+		)
+
+		async for document in cursor.skip(skip).limit(limit):
+			yield document
 
-		return references
+	def _find_sorted(
+		self,
+		collection: AsyncIOMotorCollection,
+		filters: dict,
+		projection: dict,
+		sort_by: Optional[str],
+		descending: bool,
+	) -> AsyncIOMotorCursor:
+		""" Finds the documents that match the filters, in a stable order
+			so that pages do not overlap. Documents are fetched in batches
+			of STREAM_BATCH_SIZE.
+
+			Args:
+				collection: The collection to search
+				filters: The filters of the documents
+				projection: The fields of the documents to return
+				sort_by: The field to sort by. Ties are sorted by _id
+				descending: Whether to sort in descending order
+
+			Returns:
+				cursor: A cursor over the documents
+		"""
+		direction = DESCENDING if descending else ASCENDING
+
+		sort = [("_id", direction)]
+		if sort_by:
+			sort.insert(0, (sort_by, direction))
+
+		return collection.find(filters, projection).sort(sort).batch_size(config.STREAM_BATCH_SIZE)
 
 	async def update_reference_link(self, reference_id: str, book_name: str, link_type: str, link_url: str) -> int:
-		reference_doc = await self._reference_manager_coll.find_one({"_id": reference_id})
-
-		for book in reference_doc.get("books"):
-			if book.get("name") == book_name:
-				has_links = False
-				for link in book.get("book_links"):
-					if link.get("link_type") == link_type:
-						has_links = True
-						break
-
-				if has_links:
-					for i, link in enumerate(book.get("book_links")):
-						if link.get("link_type") == link_type:
-							if link_url == "":
-								del book["book_links"][i]
-							else:
-								link["link_url"] = link_url
-							break
-				else:
-					book["book_links"].append(
-						dict(
-							link_type=link_type,
-							link_url=link_url,
-						)
-					)
-
-		result = await self._reference_manager_coll.update_one(
-			{'_id': reference_id},
-			{'$set': reference_doc}
-		)
+		return await self.update_reference_links([
+			dict(
+				reference_id=reference_id,
+				book_name=book_name,
+				link_type=link_type,
+				link_url=link_url,
+			)
+		])
+
+	async def update_reference_links(self, links: List[dict]) -> int:
+		# Books without links have a null (or no) book_links array, which
+		# links cannot be pushed to. Set apart, so that they are not counted
+		missing_links = [
+			self._get_missing_links_operation(link["reference_id"], link["book_name"])
+			for link in links
+			if link["link_url"] != ""
+		]
+		if missing_links:
+			await self._reference_manager_coll.bulk_write(missing_links, ordered=False)
+
+		operations = []
+		for link in links:
+			operations.extend(self._get_link_operations(**link))
+
+		# Operations depend on the ones before them, so they run in order.
+		# At most one of the operations of a link modifies it
+		result = await self._reference_manager_coll.bulk_write(operations, ordered=True)
 
 		return result.modified_count
+
+	def _get_missing_links_operation(self, reference_id: str, book_name: str) -> UpdateOne:
+		""" Builds the update that gives a book an empty array of links,
+			if it has none yet.
+
+			Args:
+				reference_id: The unique id of the reference
+				book_name: The name of the book in the reference
+
+			Returns:
+				operation: The update operation
+		"""
+		return UpdateOne(
+			{"_id": reference_id},
+			{"$set": {"books.$[book].book_links": []}},
+			array_filters=[{"book.name": book_name, "book.book_links": None}],
+		)
+
+	def _get_link_operations(self, reference_id: str, book_name: str, link_type: str, link_url: str) -> List[UpdateOne]:
+		""" Builds the updates of a single link. Each one only touches
+			the link itself, using positional updates with arrayFilters,
+			so concurrent edits of the rest of the reference are kept.
+
+			Args:
+				reference_id: The unique id of the reference
+				book_name: The name of the book in the reference
+				link_type: The type of the link
+				link_url: The new url of the link, or an empty string
+
+			Returns:
+				operations: The update operations, to run in order once
+					the book has an array of links
+		"""
+		reference_filter = {"_id": reference_id}
+
+		if link_url == "":
+			return [
+				UpdateOne(
+					reference_filter,
+					{"$pull": {"books.$[book].book_links": {"link_type": link_type}}},
+					array_filters=[{"book.name": book_name}],
+				),
+			]
+
+		return [
+			# Replace the link, if the book has one of this type
+			UpdateOne(
+				reference_filter,
+				{"$set": {"books.$[book].book_links.$[link].link_url": link_url}},
+				array_filters=[{"book.name": book_name}, {"link.link_type": link_type}],
+			),
+			# Otherwise add it
+			UpdateOne(
+				reference_filter,
+				{"$push": {"books.$[book].book_links": dict(link_type=link_type, link_url=link_url)}},
+				array_filters=[{"book.name": book_name, "book.book_links.link_type": {"$ne": link_type}}],
+			),
+		]
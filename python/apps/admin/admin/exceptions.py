@@ -77,3 +77,22 @@ async def exception_handling():
 	except Exception as exc:
 		logger.exception(repr(exc))
 		raise HTTPException(status_code=500, detail="An error has occurred. Please try again.")
+
+
+def get_stream_error(exc: Exception) -> str:
+	""" Logs an error raised while a response was being streamed, when
+		its status has already been sent and exception_handling() no
+		longer applies.
+
+		Args:
+			exc: The error raised by the items of the stream
+
+		Returns:
+			message: The message of the final error record of the stream
+	"""
+	if isinstance(exc, DatabaseConnectionError):
+		logger.exception(f"Failed to connect to the database: {repr(exc)}")
+		return "Cannot serve results at the moment. Please try again."
+
+	logger.exception(repr(exc))
+	return "An error has occurred. Please try again."
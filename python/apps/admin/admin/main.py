@@ -24,12 +24,17 @@ from fastapi.templating import Jinja2Templates
 #from sentry_sdk import capture_message
 
 from contextlog import contextlog
+from fastjson import (
+	json_object_response,
+	ndjson_response,
+)
 from admin import config
 from admin import db_client
 from admin.exceptions import (
 	AuthorizationException,
 	DocumentExists,
 	exception_handling,
+	get_stream_error,
 )
 from admin.auth import (
 	schemes as auth_schemes,
@@ -40,8 +45,12 @@ from admin.models.auth_models import (
 	AdminUser,
 	FilterReferencesRequest,
 	FilterUsersRequest,
+	ListRequest,
 	LoginRequest,
+	ResponseFormat,
+	SortOrder,
 	UpdateReferenceLinkRequest,
+	UpdateReferenceLinksRequest,
 	UpdateUserRequest,
 )
 from admin.models.db_models import (
@@ -80,6 +89,7 @@ async def startup_event():
 
 	async with exception_handling():
 		await db_client.start_session()
+		await db_client.create_indexes()
 
 
 @app.on_event("shutdown")
@@ -177,18 +187,13 @@ async def get_users(
 	admin_user: AdminUser = Depends(access_token_cookie_scheme),
 ):
 	async with exception_handling():
-		users = await db_client.get_users(
+		users = db_client.get_users(
 			requested_join=filter_users_request.requested_join,
-			is_author=filter_users_request.is_author
+			is_author=filter_users_request.is_author,
+			**get_listing_options(filter_users_request),
 		)
 
-		response = JSONResponse(
-			content=jsonable_encoder({
-				"users": users,
-			}),
-		)
-
-		return response
+		return get_listing_response("users", users, filter_users_request)
 
 
 @app.post("/user")
@@ -218,19 +223,14 @@ async def get_references(
 	admin_user: AdminUser = Depends(access_token_cookie_scheme),
 ):
 	async with exception_handling():
-		references = await db_client.get_references(
+		references = db_client.get_references(
 			has_amazon_links=filter_references_request.has_amazon_links,
 			has_waterstones_links=filter_references_request.has_waterstones_links,
 			has_bookdepository_links=filter_references_request.has_bookdepository_links,
+			**get_listing_options(filter_references_request),
 		)
 
-		response = JSONResponse(
-			content=jsonable_encoder({
-				"references": references,
-			}),
-		)
-
-		return response
+		return get_listing_response("references", references, filter_references_request)
 
 
 @app.post("/reference")
@@ -253,3 +253,63 @@ async def update_reference_link(
 		)
 
 		return response
+
+
+@app.post("/reference-links")
+async def update_reference_links(
+	update_reference_links_request: UpdateReferenceLinksRequest,
+	admin_user: AdminUser = Depends(access_token_cookie_scheme),
+):
+	async with exception_handling():
+		modified = await db_client.update_reference_links(
+			[link.dict() for link in update_reference_links_request.links]
+		)
+
+		response = JSONResponse(
+			content=jsonable_encoder({
+				"success": modified,
+			}),
+		)
+
+		return response
+
+
+def get_listing_options(list_request: ListRequest) -> dict:
+	""" Translates the pagination and sorting of a listing request
+		to the arguments of the database client.
+
+		Args:
+			list_request: A listing request
+
+		Returns:
+			options: The sort_by, descending, skip and limit arguments
+	"""
+	page_size = list_request.page_size or 0
+
+	return dict(
+		sort_by=list_request.sort_by.value if list_request.sort_by else None,
+		descending=list_request.sort_order == SortOrder.desc,
+		skip=list_request.page * page_size,
+		limit=page_size,
+	)
+
+
+def get_listing_response(key: str, documents, list_request: ListRequest) -> Response:
+	""" Streams the documents of a listing, in the requested format.
+
+		The documents are serialized as they are read from the database,
+		so the listing is never held in memory as a whole. An error while
+		reading them ends the listing with an error record.
+
+		Args:
+			key: The key of the documents in a json response
+			documents: An async iterator of documents
+			list_request: A listing request
+
+		Returns:
+			response: A streaming response
+	"""
+	if list_request.response_format == ResponseFormat.ndjson:
+		return ndjson_response(documents, on_error=get_stream_error)
+
+	return json_object_response(key, documents, on_error=get_stream_error)
@@ -1,6 +1,7 @@
+from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, conint, conlist, constr, root_validator
 
 
 class AdminUser(BaseModel):
@@ -22,9 +23,44 @@ class FilterOptions(BaseModel):
 	filter_no = 2
 
 
-class FilterUsersRequest(BaseModel):
+class SortOrder(str, Enum):
+	asc = "asc"
+	desc = "desc"
+
+
+class ResponseFormat(str, Enum):
+	""" json: {"<items>": [...]}, ndjson: One item per line """
+	json = "json"
+	ndjson = "ndjson"
+
+
+class ListRequest(BaseModel):
+	""" Pagination, sorting and format of a listing. All items are
+		returned, unless a page_size is given. A sorted listing must
+		be paged, as its sort is not served by an index.
+	"""
+	sort_order: SortOrder = SortOrder.asc
+	page: conint(ge=0) = 0
+	page_size: Optional[conint(gt=0, le=1000)]
+	response_format: ResponseFormat = ResponseFormat.json
+
+	@root_validator(skip_on_failure=True)
+	def check_sorted_listing_is_paged(cls, values):
+		if values.get("sort_by") is not None and values.get("page_size") is None:
+			raise ValueError("page_size is required when sort_by is set")
+
+		return values
+
+
+class UserSortField(str, Enum):
+	username = "username"
+	created_at = "created_at"
+
+
+class FilterUsersRequest(ListRequest):
 	requested_join: Optional[int]
 	is_author: Optional[int]
+	sort_by: Optional[UserSortField]
 
 
 class UpdateUserRequest(BaseModel):
@@ -33,14 +69,27 @@ class UpdateUserRequest(BaseModel):
 	is_author: Optional[bool]
 
 
-class FilterReferencesRequest(BaseModel):
+class ReferenceSortField(str, Enum):
+	title = "title"
+	category = "category"
+	created_at = "metadata.created_at"
+	positive_rating = "rating.positive"
+	negative_rating = "rating.negative"
+
+
+class FilterReferencesRequest(ListRequest):
 	has_amazon_links: Optional[int]
 	has_waterstones_links: Optional[int]
 	has_bookdepository_links: Optional[int]
+	sort_by: Optional[ReferenceSortField]
 
 
 class UpdateReferenceLinkRequest(BaseModel):
 	reference_id: constr(min_length=36)
 	book_name: str
 	link_type: str
-	link_url: str
\ No newline at end of file
+	link_url: str
+
+
+class UpdateReferenceLinksRequest(BaseModel):
+	links: conlist(UpdateReferenceLinkRequest, min_items=1, max_items=1000)
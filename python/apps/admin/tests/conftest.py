@@ -0,0 +1,15 @@
+# contextlog expects logging.handlers to be imported already, as uvicorn does
+import logging.handlers
+import os
+
+
+# The configuration of the service is read from the environment on import
+for key, value in dict(
+	APP_NAME="admin",
+	LOCAL_DEPLOYMENT="true",
+	DATABASE_TYPE="mongodb",
+	DATABASE_HOST="localhost",
+	DATABASE_PORT="27017",
+	DATABASE_NAME="admin-tests",
+).items():
+	os.environ.setdefault(key, value)
@@ -0,0 +1,127 @@
+"""
+	Links are updated in place, with arrayFilters, and only the links
+	that change are counted.
+
+	mongomock does not implement arrayFilters, so these only run when
+	TEST_MONGODB_URI points to a MongoDB server.
+"""
+import asyncio
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+import pytest
+
+from admin import config, db_client
+
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_MONGODB_URI"), reason="TEST_MONGODB_URI is not set")
+
+REFERENCE_ID = "reference-1"
+AMAZON_URL = "https://www.amazon.com/a-book"
+
+
+def use_database(motor_client):
+	db = motor_client[config.MONGODB_DATABASE]
+
+	db_client._motor_client = motor_client
+	db_client._db = db
+	db_client._reference_manager_coll = db[config.MONGODB_REFERENCE_MANAGER_COLLECTION]
+
+
+def get_book(name: str, **book_links) -> dict:
+	book = dict(name=name, author="An author", book_sections=[dict(starting_page=1, ending_page=2)])
+	book.update(book_links)
+
+	return book
+
+
+async def insert_reference(*books):
+	await db_client._reference_manager_coll.delete_many({})
+	await db_client._reference_manager_coll.insert_one({"_id": REFERENCE_ID, "title": "A reference", "books": list(books)})
+
+
+async def get_links(book_name: str) -> list:
+	reference = await db_client._reference_manager_coll.find_one({"_id": REFERENCE_ID})
+
+	for book in reference["books"]:
+		if book["name"] == book_name:
+			return book.get("book_links")
+
+
+def run(coroutine):
+	use_database(AsyncIOMotorClient(os.environ["TEST_MONGODB_URI"]))
+
+	return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def test_link_is_added_to_a_book_without_links():
+	async def check():
+		await insert_reference(get_book("First book", book_links=None), get_book("Second book"))
+
+		for book_name in ("First book", "Second book"):
+			assert await db_client.update_reference_link(REFERENCE_ID, book_name, "amazon", AMAZON_URL) == 1
+			assert await get_links(book_name) == [dict(link_type="amazon", link_url=AMAZON_URL)]
+
+	run(check())
+
+
+def test_link_is_replaced_and_removed():
+	async def check():
+		await insert_reference(get_book("First book", book_links=[
+			dict(link_type="amazon", link_url=AMAZON_URL),
+			dict(link_type="waterstones", link_url="https://www.waterstones.com/a-book"),
+		]))
+
+		new_url = "https://www.amazon.com/another-edition"
+		assert await db_client.update_reference_link(REFERENCE_ID, "First book", "amazon", new_url) == 1
+		# The same url again changes nothing
+		assert await db_client.update_reference_link(REFERENCE_ID, "First book", "amazon", new_url) == 0
+		assert await get_links("First book") == [
+			dict(link_type="amazon", link_url=new_url),
+			dict(link_type="waterstones", link_url="https://www.waterstones.com/a-book"),
+		]
+
+		assert await db_client.update_reference_link(REFERENCE_ID, "First book", "amazon", "") == 1
+		assert await db_client.update_reference_link(REFERENCE_ID, "First book", "amazon", "") == 0
+		assert await get_links("First book") == [
+			dict(link_type="waterstones", link_url="https://www.waterstones.com/a-book"),
+		]
+
+	run(check())
+
+
+def test_links_are_counted_once_each():
+	async def check():
+		await insert_reference(
+			get_book("First book", book_links=None),
+			get_book("Second book", book_links=[dict(link_type="amazon", link_url=AMAZON_URL)]),
+			get_book("Third book", book_links=[]),
+		)
+
+		modified_count = await db_client.update_reference_links([
+			dict(reference_id=REFERENCE_ID, book_name="First book", link_type="amazon", link_url=AMAZON_URL),
+			dict(reference_id=REFERENCE_ID, book_name="First book", link_type="waterstones", link_url="https://www.waterstones.com/a-book"),
+			dict(reference_id=REFERENCE_ID, book_name="Second book", link_type="amazon", link_url=AMAZON_URL),
+			dict(reference_id=REFERENCE_ID, book_name="Third book", link_type="amazon", link_url=""),
+		])
+
+		# Unchanged links are not counted, nor are the arrays of links created
+		assert modified_count == 2
+		assert len(await get_links("First book")) == 2
+		assert await get_links("Second book") == [dict(link_type="amazon", link_url=AMAZON_URL)]
+		assert await get_links("Third book") == []
+
+	run(check())
+
+
+def test_other_books_are_kept():
+	async def check():
+		await insert_reference(get_book("First book"), get_book("Second book"))
+
+		await db_client.update_reference_link(REFERENCE_ID, "First book", "amazon", AMAZON_URL)
+
+		reference = await db_client._reference_manager_coll.find_one({"_id": REFERENCE_ID})
+		assert reference["books"][1] == get_book("Second book")
+		assert reference["title"] == "A reference"
+
+	run(check())
@@ -0,0 +1,123 @@
+"""
+	Benchmark of rendering large JSON responses.
+
+	Times building the responses of the services, which renders their
+	body, for two kinds of content:
+
+		search: A /search response of the consumer, i.e plain dicts of
+			the hits of elasticsearch, JSONResponse(content) (before)
+			vs FastJSONResponse(content)
+		models: A list of references as pydantic models, as returned
+			by admin, JSONResponse(jsonable_encoder(content)) (before)
+			vs FastJSONResponse(content)
+
+	Every reference has a number of books, each of a number of sections.
+
+	Run from the consumer directory, i.e
+
+		python benchmarks/json_responses.py --references 20 --books 50 --sections 100
+"""
+import argparse
+import datetime
+import json
+import timeit
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastjson import FastJSONResponse
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+class BookSection(BaseModel):
+	starting_page: int
+	ending_page: int
+
+
+class Book(BaseModel):
+	name: str
+	author: str
+	book_sections: List[BookSection]
+
+
+class Reference(BaseModel):
+	reference_id: str
+	title: str
+	description: str
+	books: List[Book]
+	created_at: datetime.datetime
+	rating: Optional[int]
+
+
+def get_references(references: int, books: int, sections: int) -> List[dict]:
+	""" Builds reference documents
+
+		Args:
+			references: The number of references
+			books: The number of books of every reference
+			sections: The number of sections of every book
+
+		Returns:
+			documents: The reference documents
+	"""
+	return [
+		dict(
+			reference_id=f"reference-{reference}",
+			title=f"Reference number {reference}",
+			description="A description of the reference to benchmark",
+			books=[
+				dict(
+					name=f"Book number {book}",
+					author=f"Author number {book}",
+					book_sections=[dict(starting_page=page, ending_page=page + 1) for page in range(1, sections + 1)],
+				)
+				for book in range(books)
+			],
+			created_at="2020-06-01T12:00:00",
+			rating=None,
+		)
+		for reference in range(references)
+	]
+
+
+def best_of(build, repeat: int) -> float:
+	return min(timeit.repeat(build, number=1, repeat=repeat)) * 1000
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--references", type=int, default=20)
+	parser.add_argument("--books", type=int, default=50)
+	parser.add_argument("--sections", type=int, default=100)
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+
+	documents = get_references(args.references, args.books, args.sections)
+
+	search = {"responses": [{"hits": {"hits": [{"_id": document["reference_id"], "_source": document} for document in documents]}}]}
+	models = {"references": [Reference(**document) for document in documents]}
+
+	for kind, before, after in (
+		("search", lambda: JSONResponse(content=search), lambda: FastJSONResponse(content=search)),
+		("models", lambda: JSONResponse(content=jsonable_encoder(models)), lambda: FastJSONResponse(content=models)),
+	):
+		# Both render the same JSON
+		assert json.loads(before().body) == json.loads(after().body)
+
+		before_ms = best_of(before, args.repeat)
+		after_ms = best_of(after, args.repeat)
+
+		print(json.dumps({
+			"content": kind,
+			"references": args.references,
+			"books": args.books,
+			"sections": args.sections,
+			"body_kb": round(len(after().body) / 1024),
+			"before_ms": round(before_ms, 2),
+			"after_ms": round(after_ms, 2),
+			"speedup": round(before_ms / after_ms, 1),
+		}))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,185 @@
+"""
+	Load benchmark of the search endpoint of the consumer.
+
+	Starts a stub elasticsearch server, which answers every '_msearch'
+	after a fixed latency, and the consumer in front of it. Then sends
+	concurrent search requests and reports the throughput, the latency
+	percentiles and the number of '_msearch' calls the stub received.
+
+	Run from the consumer directory, i.e
+
+		python benchmarks/msearch_load.py --requests 2000 --concurrency 100
+
+	The consumer is configured through the environment as usual, so
+	features can be compared by toggling them, i.e
+	SEARCH_BATCHING_ENABLED=true.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+
+def run_stub(port: int, latency: float):
+	""" Runs a stub elasticsearch server, until killed
+
+		Args:
+			port: The port to listen to
+			latency: The latency of each '_msearch' call, in seconds
+	"""
+	calls = {"msearch": 0}
+
+	async def msearch(request):
+		lines = [line for line in (await request.text()).split("\n") if line]
+		calls["msearch"] += 1
+		await asyncio.sleep(latency)
+		responses = [
+			{"status": 200, "hits": {"total": {"value": 1}, "hits": [{"_id": str(i), "_source": json.loads(line)}]}}
+			for i, line in enumerate(lines[1::2])
+		]
+		return web.json_response({"took": 1, "responses": responses})
+
+	async def stats(request):
+		return web.json_response(calls)
+
+	async def root(request):
+		return web.json_response({
+			"version": {"number": "7.6.2", "build_flavor": "default"},
+			"tagline": "You Know, for Search",
+		})
+
+	@web.middleware
+	async def product_header(request, handler):
+		# Checked by the clients of elasticsearch as of 7.14
+		response = await handler(request)
+		response.headers["X-Elastic-Product"] = "Elasticsearch"
+		return response
+
+	app = web.Application(middlewares=[product_header])
+	app.router.add_get("/", root)
+	app.router.add_get("/_benchmark/calls", stats)
+	app.router.add_post("/_msearch", msearch)
+	app.router.add_post("/{index}/_msearch", msearch)
+	web.run_app(app, port=port, print=None)
+
+
+async def wait_until_up(session: aiohttp.ClientSession, url: str):
+	""" Waits for a server to accept requests
+
+		Args:
+			session: The client session
+			url: The url to poll
+	"""
+	for _ in range(100):
+		try:
+			async with session.get(url):
+				return
+		except aiohttp.ClientError:
+			await asyncio.sleep(0.1)
+
+	raise RuntimeError(f"{url} did not come up")
+
+
+async def run_load(args: argparse.Namespace) -> dict:
+	""" Sends the search requests and measures them
+
+		Args:
+			args: The command line arguments
+
+		Returns:
+			results: The measurements
+	"""
+	search_url = f"http://localhost:{args.port}{os.environ['SEARCH_ENDPOINT']}"
+	latencies = []
+	semaphore = asyncio.Semaphore(args.concurrency)
+
+	async def send(session: aiohttp.ClientSession, i: int):
+		# Distinct searches, unless asked otherwise, so that none is coalesced
+		category = "arts" if args.identical else f"category-{i}"
+		body = (
+			json.dumps({"preference": "SearchResult"}) + "\n"
+			+ json.dumps({"query": {"match": {"category": category}}, "size": 10}) + "\n"
+		)
+		async with semaphore:
+			start = time.perf_counter()
+			async with session.post(search_url, data=body) as response:
+				await response.read()
+				if response.status != 200:
+					raise RuntimeError(f"Search failed with {response.status}")
+			latencies.append(time.perf_counter() - start)
+
+	connector = aiohttp.TCPConnector(limit=args.concurrency)
+	async with aiohttp.ClientSession(connector=connector) as session:
+		await wait_until_up(session, f"http://localhost:{args.stub_port}/")
+		await wait_until_up(session, f"http://localhost:{args.port}/documentation")
+
+		start = time.perf_counter()
+		await asyncio.gather(*[send(session, i) for i in range(args.requests)])
+		elapsed = time.perf_counter() - start
+
+		async with session.get(f"http://localhost:{args.stub_port}/_benchmark/calls") as response:
+			calls = await response.json()
+
+	latencies.sort()
+
+	return {
+		"requests": args.requests,
+		"concurrency": args.concurrency,
+		"requests_per_second": round(args.requests / elapsed, 1),
+		"p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+		"p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+		"msearch_calls": calls["msearch"],
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--requests", type=int, default=2000)
+	parser.add_argument("--concurrency", type=int, default=100)
+	parser.add_argument("--latency-ms", type=float, default=10, help="Latency of the stub elasticsearch")
+	parser.add_argument("--identical", action="store_true", help="Send the same search in every request")
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--stub-port", type=int, default=9765)
+	parser.add_argument("--stub", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.stub:
+		run_stub(args.stub_port, args.latency_ms / 1000)
+		return
+
+	env = dict(os.environ)
+	env.setdefault("APP_NAME", "consumer")
+	env.setdefault("LOCAL_DEPLOYMENT", "true")
+	env.setdefault("ELASTICSEARCH_INDEX", "referencemanager")
+	env.setdefault("SEARCH_ENDPOINT", "/search/_msearch/")
+	env["ELASTICSEARCH_HOST"] = f"localhost:{args.stub_port}"
+	os.environ.update(env)
+
+	stub = subprocess.Popen(
+		[sys.executable, __file__, "--stub", "--stub-port", str(args.stub_port), "--latency-ms", str(args.latency_ms)],
+	)
+	consumer = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "consumer.main:app", "--port", str(args.port), "--log-level", "warning"],
+		env=env,
+		stdout=subprocess.DEVNULL,
+	)
+
+	try:
+		results = asyncio.get_event_loop().run_until_complete(run_load(args))
+	finally:
+		consumer.terminate()
+		stub.terminate()
+		consumer.wait()
+		stub.wait()
+
+	print(json.dumps(results))
+
+
+if __name__ == "__main__":
+	main()
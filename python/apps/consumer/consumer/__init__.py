@@ -1,8 +1,25 @@
 import sentry_sdk
 
 from consumer import config
+from consumer.cache import SearchCache
+from consumer.costguard import CostGuard
+from consumer.singleflight import SingleFlight
 
 
 if config.SENTRY_ENABLED:
 	# Initialize sentry SDK
 	sentry_sdk.init(config.SENTRY_ENDPOINT)
+
+# Initialize search cache
+search_cache = SearchCache(
+	maxsize=config.SEARCH_CACHE_MAXSIZE,
+	ttl=config.SEARCH_CACHE_TTL_SECONDS,
+)
+# Initialize registry of in flight searches
+in_flight_searches = SingleFlight()
+# Initialize cost guard of searches
+cost_guard = CostGuard(
+	max_cost=config.SEARCH_MAX_QUERY_COST,
+	max_aggregation_depth=config.SEARCH_MAX_AGGREGATION_DEPTH,
+	scripts_allowed=config.SEARCH_SCRIPTS_ALLOWED,
+)
@@ -0,0 +1,95 @@
+"""
+	Micro-batching of the '_msearch' items of concurrent requests.
+
+	Items are collected for a short window, or until there are enough
+	of them, and sent to elasticsearch in a single '_msearch' call.
+	The response of each item is then handed back to its request.
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+
+class MicroBatcher:
+	""" Collects '_msearch' items of concurrent requests into batches """
+	def __init__(
+		self,
+		send: Callable[[List[Tuple[dict, dict]]], Awaitable[List[dict]]],
+		window_seconds: float,
+		max_items: int,
+	):
+		""" Args:
+				send: Sends a batch of items and returns the response of each
+				window_seconds: How long to wait for more items, after the first
+				max_items: Number of items that are sent without waiting any longer
+		"""
+		self._send = send
+		self._window_seconds = window_seconds
+		self._max_items = max_items
+		self._pending = []
+		self._timer: Optional[asyncio.TimerHandle] = None
+		# The event loop only keeps weak references to tasks
+		self._tasks = set()
+		# Counters of the batches and items sent
+		self.batches = 0
+		self.items = 0
+
+	async def submit(self, items: List[Tuple[dict, dict]]) -> List[dict]:
+		""" Adds items to the next batch and waits for their responses
+
+			Args:
+				items: A list of (header, query) tuples
+
+			Returns:
+				responses: The elasticsearch response of each item
+		"""
+		loop = asyncio.get_event_loop()
+
+		futures = []
+		for item in items:
+			future = loop.create_future()
+			self._pending.append((item, future))
+			futures.append(future)
+
+			# Batches never exceed max_items, however many items a request has
+			if len(self._pending) >= self._max_items:
+				self._flush()
+
+		if self._pending and self._timer is None:
+			self._timer = loop.call_later(self._window_seconds, self._flush)
+
+		return await asyncio.gather(*futures)
+
+	def _flush(self):
+		""" Sends the pending items as a batch """
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+
+		batch, self._pending = self._pending, []
+
+		if batch:
+			task = asyncio.ensure_future(self._send_batch(batch))
+			self._tasks.add(task)
+			task.add_done_callback(self._tasks.discard)
+
+	async def _send_batch(self, batch: List[Tuple[Tuple[dict, dict], asyncio.Future]]):
+		""" Sends a batch and resolves the future of each of its items
+
+			Args:
+				batch: The items of the batch, along with their futures
+		"""
+		self.batches += 1
+		self.items += len(batch)
+
+		try:
+			responses = await self._send([item for item, _ in batch])
+		except Exception as exc:
+			for _, future in batch:
+				# The request may have gone away in the meantime
+				if not future.done():
+					future.set_exception(exc)
+			return
+
+		for (_, future), response in zip(batch, responses):
+			if not future.done():
+				future.set_result(response)
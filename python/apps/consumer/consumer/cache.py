@@ -0,0 +1,71 @@
+"""
+	In-process cache for the responses of individual '_msearch' items.
+
+	Every worker of the consumer holds its own cache, and entries are
+	never evicted when documents change. Writes are synced to
+	elasticsearch asynchronously anyway, so searches may be stale for
+	at most SEARCH_CACHE_TTL_SECONDS after they reach it.
+"""
+from collections import OrderedDict
+import time
+from typing import Optional
+
+
+class SearchCache():
+	""" Size bounded LRU cache with a TTL, holding the elasticsearch
+		response of each (header, query) pair of an '_msearch' request.
+	"""
+	def __init__(self, maxsize: int, ttl: int):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+
+	def get(self, key: str) -> Optional[dict]:
+		""" Returns the cached response of a search, if there is one
+			that has not expired.
+
+			Args:
+				key: The normalised key of the search
+
+			Returns:
+				response: The cached elasticsearch response, if found
+		"""
+		entry = self._entries.get(key)
+
+		if entry is None or entry[0] < time.monotonic():
+			if entry is not None:
+				del self._entries[key]
+
+			self.misses += 1
+			return None
+
+		self._entries.move_to_end(key)
+		self.hits += 1
+
+		return entry[1]
+
+	def set(self, key: str, response: dict):
+		""" Caches the response of a search, evicting the least
+			recently used entries when the cache is full.
+
+			Args:
+				key: The normalised key of the search
+				response: The elasticsearch response of the search
+		"""
+		self._entries[key] = (time.monotonic() + self.ttl, response)
+		self._entries.move_to_end(key)
+
+		while len(self._entries) > self.maxsize:
+			self._entries.popitem(last=False)
+
+	def stats(self) -> dict:
+		""" Returns the counters of the cache, for sizing it """
+		return dict(
+			size=len(self._entries),
+			maxsize=self.maxsize,
+			ttl=self.ttl,
+			hits=self.hits,
+			misses=self.misses,
+		)
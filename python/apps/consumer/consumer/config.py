@@ -11,6 +11,70 @@ ELASTICSEARCH_HOST = os.getenv("ELASTICSEARCH_HOST")
 ELASTICSEARCH_INDEX = os.getenv("ELASTICSEARCH_INDEX")
 SEARCH_ENDPOINT = os.getenv("SEARCH_ENDPOINT")
 
+# Elasticsearch async transport configuration
+ELASTICSEARCH_MAX_CONNECTIONS = int(os.getenv("ELASTICSEARCH_MAX_CONNECTIONS", 100))
+ELASTICSEARCH_TIMEOUT = int(os.getenv("ELASTICSEARCH_TIMEOUT", 10))
+ELASTICSEARCH_MAX_RETRIES = int(os.getenv("ELASTICSEARCH_MAX_RETRIES", 3))
+
+# Forward validated '_msearch' bodies to elasticsearch as they are,
+# without rebuilding them through elasticsearch_dsl
+SEARCH_PASSTHROUGH_ENABLED = True if os.getenv("SEARCH_PASSTHROUGH_ENABLED", "false") == "true" else False
+SEARCH_ALLOWED_HEADER_KEYS = os.getenv(
+	"SEARCH_ALLOWED_HEADER_KEYS",
+	"index,preference,request_cache,search_type",
+).split(",")
+SEARCH_ALLOWED_QUERY_KEYS = os.getenv(
+	"SEARCH_ALLOWED_QUERY_KEYS",
+	"query,aggs,aggregations,size,from,sort,_source,highlight,post_filter,suggest,track_total_hits",
+).split(",")
+SEARCH_MAX_SIZE = int(os.getenv("SEARCH_MAX_SIZE", 100))
+# Elasticsearch refuses to page beyond index.max_result_window
+SEARCH_MAX_RESULT_WINDOW = int(os.getenv("SEARCH_MAX_RESULT_WINDOW", 10000))
+
+# Cache of search responses, per worker. Not applied in pass-through
+# mode, where the responses of elasticsearch are never decoded. Entries
+# are not evicted on writes, searches are stale for at most the TTL
+SEARCH_CACHE_ENABLED = True if os.getenv("SEARCH_CACHE_ENABLED", "false") == "true" else False
+SEARCH_CACHE_MAXSIZE = int(os.getenv("SEARCH_CACHE_MAXSIZE", 10000))
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 60))
+
+# Identical searches of concurrent requests share a single call to elasticsearch
+SEARCH_COALESCING_ENABLED = True if os.getenv("SEARCH_COALESCING_ENABLED", "true") == "true" else False
+
+# Named search templates. Rendered queries are cached by template key
+SEARCH_TEMPLATE_CACHE_MAXSIZE = int(os.getenv("SEARCH_TEMPLATE_CACHE_MAXSIZE", 1000))
+SEARCH_MAX_TEMPLATE_SEARCHES = int(os.getenv("SEARCH_MAX_TEMPLATE_SEARCHES", 10))
+
+# Micro-batching of the searches of concurrent requests into shared '_msearch'
+# calls. A batch is sent after the window, or once it has enough items
+SEARCH_BATCHING_ENABLED = True if os.getenv("SEARCH_BATCHING_ENABLED", "false") == "true" else False
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", 2))
+SEARCH_BATCH_MAX_ITEMS = int(os.getenv("SEARCH_BATCH_MAX_ITEMS", 50))
+
+# Cost guard of the searches sent to elasticsearch. Searches over the budget
+# are rejected, the others get a timeout and, unless 0, a terminate_after
+SEARCH_COST_GUARD_ENABLED = True if os.getenv("SEARCH_COST_GUARD_ENABLED", "true") == "true" else False
+SEARCH_MAX_QUERY_COST = int(os.getenv("SEARCH_MAX_QUERY_COST", 200))
+SEARCH_MAX_AGGREGATION_DEPTH = int(os.getenv("SEARCH_MAX_AGGREGATION_DEPTH", 3))
+SEARCH_SCRIPTS_ALLOWED = True if os.getenv("SEARCH_SCRIPTS_ALLOWED", "false") == "true" else False
+SEARCH_TIMEOUT = os.getenv("SEARCH_TIMEOUT", "2s")
+SEARCH_TERMINATE_AFTER = int(os.getenv("SEARCH_TERMINATE_AFTER", 100000))
+
+# Cursor based paging of templates, with search_after. Against points
+# in time of the index if enabled, which requires elasticsearch 7.12+,
+# otherwise ties are broken by a unique field
+SEARCH_PIT_ENABLED = True if os.getenv("SEARCH_PIT_ENABLED", "false") == "true" else False
+SEARCH_PIT_KEEP_ALIVE = os.getenv("SEARCH_PIT_KEEP_ALIVE", "5m")
+SEARCH_PAGING_TIEBREAKER = os.getenv("SEARCH_PAGING_TIEBREAKER", "reference_id.keyword")
+
+# Move non scoring clauses on these fields into filter context, where
+# elasticsearch caches their matches, and send aggregation only searches
+# through the shard request cache. Off until measured against a real
+# cluster, see benchmarks/README.md
+SEARCH_FILTER_REWRITE_ENABLED = True if os.getenv("SEARCH_FILTER_REWRITE_ENABLED", "false") == "true" else False
+SEARCH_FILTER_TERM_FIELDS = os.getenv("SEARCH_FILTER_TERM_FIELDS", "category,reference_id,_id").split(",")
+SEARCH_FILTER_RANGE_FIELDS = os.getenv("SEARCH_FILTER_RANGE_FIELDS", "rating.positive,rating.negative").split(",")
+
 # Sentry configuration
 SENTRY_ENABLED = True if not LOCAL_DEPLOYMENT else False
 SENTRY_ENDPOINT = os.environ.get("SENTRY_ENDPOINT", None)
@@ -0,0 +1,252 @@
+"""
+	Cost guard for the searches that are sent to elasticsearch.
+
+	Every '_msearch' item gets an estimated cost, out of its clauses,
+	aggregations and requested hits. Items over the budget, or that
+	break one of the rules below, are rejected before they reach the
+	cluster. The rest are clamped to the result window and get a
+	timeout and a terminate_after.
+"""
+from collections import Counter
+from typing import List, Tuple, Union
+
+from consumer import config
+from consumer.exceptions import InvalidSearchRequest, QueryBudgetExceeded
+
+
+# Rules that a search is rejected by
+COST_RULE = "cost"
+SCRIPT_RULE = "script"
+LEADING_WILDCARD_RULE = "leading_wildcard"
+AGGREGATION_DEPTH_RULE = "aggregation_depth"
+
+# Clauses that have to go through the terms of the index, instead of
+# looking them up, and their cost relative to any other clause
+EXPENSIVE_CLAUSES = ("fuzzy", "more_like_this", "prefix", "query_string", "regexp", "wildcard")
+EXPENSIVE_CLAUSE_COST = 20
+
+# Characters that patterns must not start with, by clause
+LEADING_WILDCARDS = {
+	"wildcard": ("*", "?"),
+	"regexp": (".",),
+}
+
+SCRIPT_KEYS = ("script", "script_score", "_script")
+
+AGGREGATION_COST = 5
+# Number of buckets that cost as much as a single clause
+BUCKETS_PER_COST = 10
+# Number of hits that cost as much as a single clause
+HITS_PER_COST = 100
+
+
+class CostGuard():
+	""" Scores, clamps and rejects the (header, query) pairs of
+		'_msearch' requests, counting the rejections of each rule.
+	"""
+	def __init__(self, max_cost: int, max_aggregation_depth: int, scripts_allowed: bool):
+		self.max_cost = max_cost
+		self.max_aggregation_depth = max_aggregation_depth
+		self.scripts_allowed = scripts_allowed
+		self.clamped = 0
+		self.rejections = Counter()
+
+	def guard(self, items: List[Tuple[dict, dict]]) -> List[Tuple[dict, dict]]:
+		""" Guards the items of an '_msearch' request. The items are
+			not modified, guarded copies of them are returned instead.
+
+			Args:
+				items: A list of (header, query) tuples
+
+			Returns:
+				items: The guarded (header, query) tuples
+
+			Raises:
+				consumer.exceptions.QueryBudgetExceeded
+		"""
+		guarded_items = []
+		for position, (header, query) in enumerate(items):
+			try:
+				guarded_items.append((header, self.guard_query(query)))
+			except QueryBudgetExceeded as exc:
+				self.rejections[exc.rule] += 1
+				raise QueryBudgetExceeded(exc.rule, f"Search {position} rejected by rule '{exc.rule}': {exc}")
+
+		return guarded_items
+
+	def guard_query(self, query: dict) -> dict:
+		""" Guards the query line of a search
+
+			Args:
+				query: The query line of the search
+
+			Returns:
+				query: A guarded copy of the query line
+
+			Raises:
+				consumer.exceptions.InvalidSearchRequest
+				consumer.exceptions.QueryBudgetExceeded
+		"""
+		query = dict(query)
+
+		if not self.scripts_allowed and has_script(query):
+			raise QueryBudgetExceeded(SCRIPT_RULE, "Scripts are not allowed")
+
+		self.clamp_window(query)
+
+		aggregations = query.get("aggs", query.get("aggregations", {}))
+
+		cost = (
+			self.get_clauses_cost(query.get("query", {}))
+			+ self.get_clauses_cost(query.get("post_filter", {}))
+			+ self.get_aggregations_cost(aggregations, depth=1)
+			+ (query["from"] + query["size"]) // HITS_PER_COST
+		)
+
+		if cost > self.max_cost:
+			raise QueryBudgetExceeded(COST_RULE, f"Estimated cost {cost} is over the budget of {self.max_cost}")
+
+		query["timeout"] = config.SEARCH_TIMEOUT
+
+		if config.SEARCH_TERMINATE_AFTER:
+			terminate_after = query.get("terminate_after")
+			if not isinstance(terminate_after, int) or not 0 < terminate_after < config.SEARCH_TERMINATE_AFTER:
+				query["terminate_after"] = config.SEARCH_TERMINATE_AFTER
+
+		return query
+
+	def clamp_window(self, query: dict):
+		""" Clamps the size and from of a query line, in place, so that
+			the requested hits stay within the result window.
+
+			Args:
+				query: The query line of the search
+
+			Raises:
+				consumer.exceptions.InvalidSearchRequest
+		"""
+		if not all(isinstance(query.get(key, 0), int) for key in ("size", "from")):
+			raise InvalidSearchRequest("Size and from must be integers")
+
+		size = min(max(query.get("size", 10), 0), config.SEARCH_MAX_SIZE)
+		from_ = min(max(query.get("from", 0), 0), config.SEARCH_MAX_RESULT_WINDOW - size)
+
+		if size != query.get("size", size) or from_ != query.get("from", from_):
+			self.clamped += 1
+
+		query["size"] = size
+		query["from"] = from_
+
+	def get_clauses_cost(self, clause: Union[dict, list]) -> int:
+		""" Estimates the cost of the clauses of a query
+
+			Args:
+				clause: A (possibly compound) query clause
+
+			Returns:
+				cost: The estimated cost of the clause
+
+			Raises:
+				consumer.exceptions.QueryBudgetExceeded
+		"""
+		if isinstance(clause, list):
+			return sum(self.get_clauses_cost(item) for item in clause)
+
+		if not isinstance(clause, dict):
+			return 0
+
+		cost = 1
+		for key, value in clause.items():
+			if key in EXPENSIVE_CLAUSES:
+				if has_leading_wildcard(key, value):
+					raise QueryBudgetExceeded(LEADING_WILDCARD_RULE, "Leading wildcards are not allowed")
+
+				cost += EXPENSIVE_CLAUSE_COST
+
+			cost += self.get_clauses_cost(value)
+
+		return cost
+
+	def get_aggregations_cost(self, aggregations: dict, depth: int) -> int:
+		""" Estimates the cost of (nested) aggregations. Each level of
+			nesting doubles the cost of the aggregations it contains.
+
+			Args:
+				aggregations: The aggregations by name
+				depth: The level of nesting of the aggregations
+
+			Returns:
+				cost: The estimated cost of the aggregations
+
+			Raises:
+				consumer.exceptions.QueryBudgetExceeded
+		"""
+		if not isinstance(aggregations, dict) or not aggregations:
+			return 0
+
+		if depth > self.max_aggregation_depth:
+			raise QueryBudgetExceeded(
+				AGGREGATION_DEPTH_RULE,
+				f"Aggregations nested deeper than {self.max_aggregation_depth} levels",
+			)
+
+		cost = 0
+		for aggregation in aggregations.values():
+			if not isinstance(aggregation, dict):
+				continue
+
+			for key, value in aggregation.items():
+				if key in ("aggs", "aggregations"):
+					cost += 2 * self.get_aggregations_cost(value, depth + 1)
+				elif key in ("filter", "filters"):
+					cost += AGGREGATION_COST + self.get_clauses_cost(value)
+				elif isinstance(value, dict):
+					size = value.get("size", 0)
+					buckets = size if isinstance(size, int) else 0
+					cost += AGGREGATION_COST + buckets // BUCKETS_PER_COST
+
+		return cost
+
+
+def has_script(value: Union[dict, list]) -> bool:
+	""" Checks whether any part of a query line includes a script
+
+		Args:
+			value: A query line, or a part of it
+
+		Returns:
+			found: Whether a script was found
+	"""
+	if isinstance(value, list):
+		return any(has_script(item) for item in value)
+
+	if not isinstance(value, dict):
+		return False
+
+	return any(key in SCRIPT_KEYS or has_script(item) for key, item in value.items())
+
+
+def has_leading_wildcard(clause_type: str, clause: dict) -> bool:
+	""" Checks whether the pattern of a wildcard or regexp clause starts
+		with a wildcard, which has elasticsearch go through every term
+		of the field.
+
+		Args:
+			clause_type: The type of the clause
+			clause: The body of the clause, by field
+
+		Returns:
+			found: Whether the pattern starts with a wildcard
+	"""
+	wildcards = LEADING_WILDCARDS.get(clause_type)
+	if wildcards is None or not isinstance(clause, dict):
+		return False
+
+	for value in clause.values():
+		if isinstance(value, dict):
+			value = value.get("value", value.get("wildcard", ""))
+
+		if isinstance(value, str) and value[:1] in wildcards:
+			return True
+
+	return False
@@ -14,10 +14,23 @@ class ElasticSearchConnectionError(ElasticSearchException):
 	pass
 
 
+class InvalidSearchRequest(ElasticSearchException):
+	pass
+
+
+class QueryBudgetExceeded(InvalidSearchRequest):
+	def __init__(self, rule: str, message: str):
+		super().__init__(message)
+		self.rule = rule
+
+
 @asynccontextmanager
 async def exception_handling():
 	try:
 		yield
+	except InvalidSearchRequest as exc:
+		logger.warning(f"Rejected search request: {repr(exc)}")
+		raise HTTPException(status_code=400, detail=str(exc))
 	except ElasticSearchConnectionError as exc:
 		logger.exception(f"Failed to connect to elastic search server: {repr(exc)}")
 		raise HTTPException(status_code=500, detail="Cannot serve results at the moment. Please try again.")
@@ -10,9 +10,10 @@ from contextvars import ContextVar
 import logging
 import ndjson
 import time
+from typing import List, Optional, Tuple
 from uuid import uuid4
 
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch, NotFoundError
 from elasticsearch_dsl import (
 	MultiSearch,
 	Search,
@@ -23,19 +24,60 @@ from fastapi import (
 	Request,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import (
+	JSONResponse,
+	Response,
+)
+from pydantic import BaseModel, conlist
 
 from consumer import config
+from consumer.batching import MicroBatcher
+from consumer import (
+	cost_guard,
+	in_flight_searches,
+	search_cache,
+)
 from consumer.exceptions import (
 	exception_handling,
 	ElasticSearchConnectionError,
+	InvalidSearchRequest,
+)
+from consumer.msearch import (
+	make_item_key,
+	parse_msearch_body,
+	validate_msearch_items,
+)
+from consumer.paging import (
+	Cursor,
+	build_page_query,
+	get_next_cursor,
+	get_paging_mode,
+	get_template_search,
 )
+from consumer.rewrite import rewrite_items
+from consumer.templates import render_template
 from contextlog import contextlog
+from fastjson import FastJSONResponse, dumps
 
 
 logger = contextlog.get_contextlog()
 
+
+class TemplateSearch(BaseModel):
+	template: str
+	params: dict = {}
+
+
+class TemplateSearchRequest(BaseModel):
+	searches: conlist(TemplateSearch, min_items=1, max_items=config.SEARCH_MAX_TEMPLATE_SEARCHES)
+
+
+class PagedSearchRequest(BaseModel):
+	template: Optional[str]
+	params: dict = {}
+	cursor: Optional[str]
+
+
 app = FastAPI(docs_url="/documentation", redoc_url=None)
 
 
@@ -57,12 +99,29 @@ if config.LOCAL_DEPLOYMENT:
 async def startup_event():
 	logger.info("Starting up consumer service")
 	global es_client
-	es_client = Elasticsearch([config.ELASTICSEARCH_HOST], max_retries=3)
+	# Non blocking client, backed by a pool of aiohttp connections
+	es_client = AsyncElasticsearch(
+		[config.ELASTICSEARCH_HOST],
+		max_retries=config.ELASTICSEARCH_MAX_RETRIES,
+		timeout=config.ELASTICSEARCH_TIMEOUT,
+		maxsize=config.ELASTICSEARCH_MAX_CONNECTIONS,
+	)
+	# The connection pool of the transport is otherwise only created
+	# lazily, on the first request that goes through the client
+	await es_client.__aenter__()
+
+	global search_batcher
+	search_batcher = MicroBatcher(
+		request_msearch,
+		window_seconds=config.SEARCH_BATCH_WINDOW_MS / 1000,
+		max_items=config.SEARCH_BATCH_MAX_ITEMS,
+	)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
 	logger.info("Shutting down consumer service")
+	await es_client.close()
 
 
 @app.middleware("http")
@@ -99,6 +158,9 @@ async def search(request: Request):
 		a new elasticsearch request, compatible with the
 		elasticsearch_dsl library.
 
+		When SEARCH_PASSTHROUGH_ENABLED is set, the body is only
+		validated and then forwarded to elasticsearch unchanged.
+
 		Args:
 			request (fastapi.Request): The incoming request
 
@@ -106,10 +168,14 @@ async def search(request: Request):
 			response (fastapi.responses.JSONResponse): The json response
 	"""
 	async with exception_handling():
-		ms = MultiSearch(using=es_client, index=config.ELASTICSEARCH_INDEX)
+		body = await request.body()
+
+		if config.SEARCH_PASSTHROUGH_ENABLED:
+			return await passthrough_search(body)
+
+		ms = MultiSearch(index=config.ELASTICSEARCH_INDEX)
 
 		# Decode the body of the request
-		body = await request.body()
 		decoded_body = ndjson.loads(body)
 
 		logger.info(f"Received - {decoded_body}")
@@ -130,18 +196,353 @@ async def search(request: Request):
 
 				ms = ms.add(search)
 
-		logger.info(f"Requested - {ms.to_dict()}")
+		request_body = ms.to_dict()
+
+		logger.info(f"Requested - {request_body}")
+
+		# Pair up the header and query lines of the request
+		items = list(zip(request_body[::2], request_body[1::2]))
+
+		if config.SEARCH_COST_GUARD_ENABLED:
+			items = cost_guard.guard(items)
+
+		if config.SEARCH_FILTER_REWRITE_ENABLED:
+			items = rewrite_items(items)
+
+		responses = {'responses': await execute_msearch(items)}
+
+		return FastJSONResponse(content=responses)
+
+
+@app.post("/search-templates/")
+async def search_templates(template_search_request: TemplateSearchRequest):
+	""" API endpoint for making searches out of named templates, instead
+		of elasticsearch DSL. The searches are sent to elasticsearch
+		in a single '_msearch' request.
+
+		Args:
+			template_search_request: The name and parameters of each search
+
+		Returns:
+			response (fastapi.responses.JSONResponse): The json response
+	"""
+	async with exception_handling():
+		keys = []
+		items = []
+		for template_search in template_search_request.searches:
+			key, header, query = render_template(template_search.template, template_search.params)
+			keys.append(key)
+			items.append((header, query))
+
+		logger.info(f"Requested - {keys}")
+
+		if config.SEARCH_COST_GUARD_ENABLED:
+			items = cost_guard.guard(items)
+
+		responses = {'responses': await execute_msearch(items, keys)}
+
+		return FastJSONResponse(content=responses)
+
+
+@app.post("/search-pages/")
+async def search_pages(paged_search_request: PagedSearchRequest):
+	""" API endpoint for paging through the results of a search template.
+		The first page is requested with the name and parameters of the
+		template, every next one with the cursor of the previous page.
+
+		Pages are fetched with 'search_after' rather than 'from', so that
+		they cost the same however deep they are.
+
+		Args:
+			paged_search_request: The template search, or the cursor of a page
+
+		Returns:
+			response (fastapi.responses.JSONResponse): The json response
+	"""
+	async with exception_handling():
+		if paged_search_request.cursor is not None:
+			cursor = Cursor.decode(paged_search_request.cursor)
+			if cursor.mode != get_paging_mode():
+				# The sort values of the cursor do not apply to the other mode
+				raise InvalidSearchRequest("The cursor was issued for another paging mode")
+
+			name, params = get_template_search(cursor.key)
+			pit_id, search_after = cursor.pit_id, cursor.search_after
+		elif paged_search_request.template is not None:
+			name, params = paged_search_request.template, paged_search_request.params
+			pit_id, search_after = None, None
+		else:
+			raise InvalidSearchRequest("Either a template or a cursor is required")
+
+		key, _, query = render_template(name, params)
+
+		if config.SEARCH_PIT_ENABLED and pit_id is None:
+			pit_id = await open_point_in_time()
+
+		page_query = build_page_query(query, pit_id, search_after)
+
+		logger.info(f"Requested page - {key}")
 
 		try:
-			response = ms.execute()
+			if pit_id is not None:
+				# Searches against a point in time must not name an index
+				response = await es_client.search(body=page_query)
+			else:
+				response = await es_client.search(body=page_query, index=config.ELASTICSEARCH_INDEX)
+		except NotFoundError as exc:
+			raise InvalidSearchRequest(f"The cursor has expired: {exc}")
 		except Exception as exc:
 			raise ElasticSearchConnectionError(exc)
 
-		responses = {'responses': []}
+		next_cursor = get_next_cursor(key, response, query["size"])
+
+		if next_cursor is None and pit_id is not None:
+			await close_point_in_time(response.get("pit_id", pit_id))
+
+		return FastJSONResponse(content={
+			"response": response,
+			"nextCursor": next_cursor.encode() if next_cursor is not None else None,
+		})
+
+
+@app.get("/search-cache/stats/")
+async def search_cache_stats():
+	""" API endpoint for getting the hit/miss counters of the search cache,
+		along with the number of searches coalesced with ones in flight
+		and the number of micro-batches sent to elasticsearch. The searches
+		clamped or rejected by the cost guard are counted as well.
+
+		Returns:
+			response (fastapi.responses.JSONResponse): The json response
+	"""
+	async with exception_handling():
+		stats = search_cache.stats()
+		stats["coalesced"] = in_flight_searches.coalesced
+		stats["batches"] = search_batcher.batches
+		stats["batched_items"] = search_batcher.items
+		stats["clamped"] = cost_guard.clamped
+		stats["rejected"] = dict(cost_guard.rejections)
+
+		return JSONResponse(content=stats)
+
+
+async def execute_msearch(items: List[Tuple[dict, dict]], keys: Optional[List[str]] = None) -> List[dict]:
+	""" Executes the (header, query) pairs of an '_msearch' request
+		and returns the response of each. Responses are served from
+		the search cache when possible, and items that are identical
+		to ones already in flight await their response. Only the
+		remaining items are sent to elasticsearch.
+
+		Args:
+			items: A list of (header, query) tuples
+			keys: The key of each item, if known. Derived from the items otherwise
+
+		Returns:
+			responses: The elasticsearch response of each item
+	"""
+	if keys is None:
+		keys = [make_item_key(header, query) for header, query in items]
+
+	if config.SEARCH_CACHE_ENABLED:
+		responses = [search_cache.get(key) for key in keys]
+	else:
+		responses = [None] * len(items)
+
+	leading = []
+	following = {}
+	for i, response in enumerate(responses):
+		if response is not None:
+			continue
+
+		future = None
+		if config.SEARCH_COALESCING_ENABLED:
+			future = in_flight_searches.get(keys[i])
+
+		if future is not None:
+			following[i] = future
+			continue
+
+		leading.append(i)
+
+		if config.SEARCH_COALESCING_ENABLED:
+			in_flight_searches.start(keys[i])
+
+	if leading:
+		await in_flight_searches.run(send_leading(items, keys, leading, responses))
+
+	for i, future in following.items():
+		responses[i] = await in_flight_searches.wait(future)
+
+	return responses
+
+
+async def send_leading(items: List[Tuple[dict, dict]], keys: List[str], leading: List[int], responses: List[dict]):
+	""" Sends the items that a request leads, then hands their responses
+		to the requests waiting for them and caches them.
+
+		Args:
+			items: A list of (header, query) tuples
+			keys: The key of each item
+			leading: The positions of the items to send
+			responses: The list to fill in with the response of each item
+
+		Raises:
+			consumer.exceptions.ElasticSearchConnectionError
+	"""
+	try:
+		await send_msearch(items, leading, responses)
+	finally:
+		if config.SEARCH_COALESCING_ENABLED:
+			for i in leading:
+				in_flight_searches.finish(keys[i], responses[i])
+
+	if config.SEARCH_CACHE_ENABLED:
+		for i in leading:
+			search_cache.set(keys[i], responses[i])
+
+
+async def send_msearch(items: List[Tuple[dict, dict]], selected: List[int], responses: List[dict]):
+	""" Sends the selected (header, query) pairs to elasticsearch in
+		a single '_msearch' call, and fills in their responses.
+
+		When SEARCH_BATCHING_ENABLED is set, the pairs are instead added
+		to the next micro-batch, which may include the pairs of other
+		concurrent requests.
+
+		Args:
+			items: A list of (header, query) tuples
+			selected: The positions of the items to send
+			responses: The list to fill in with the response of each item
+
+		Raises:
+			consumer.exceptions.ElasticSearchConnectionError
+	"""
+	selected_items = [items[i] for i in selected]
+
+	if config.SEARCH_BATCHING_ENABLED:
+		selected_responses = await search_batcher.submit(selected_items)
+	else:
+		selected_responses = await request_msearch(selected_items)
+
+	for i, item in zip(selected, selected_responses):
+		if item.get('error'):
+			raise ElasticSearchConnectionError(item['error'])
+
+		responses[i] = item
+
+	logger.info(f"Responded - {selected_responses}")
+
+
+async def request_msearch(items: List[Tuple[dict, dict]]) -> List[dict]:
+	""" Makes a single '_msearch' call to elasticsearch
+
+		Args:
+			items: A list of (header, query) tuples
+
+		Returns:
+			responses: The elasticsearch response of each item
+
+		Raises:
+			consumer.exceptions.ElasticSearchConnectionError
+	"""
+	body = []
+	for item in items:
+		body.extend(item)
+
+	try:
+		response = await es_client.msearch(
+			body=body,
+			index=config.ELASTICSEARCH_INDEX,
+		)
+	except Exception as exc:
+		raise ElasticSearchConnectionError(exc)
+
+	return response['responses']
 
-		for item in response:
-			responses['responses'].append(item.to_dict())
 
-		logger.info(f"Responded - {response}")
+async def open_point_in_time() -> str:
+	""" Opens a point in time of the index, for paging through a search
+
+		Returns:
+			pit_id: The id of the point in time
 
-		return JSONResponse(content=responses)
+		Raises:
+			consumer.exceptions.ElasticSearchConnectionError
+	"""
+	# The client only has helpers for points in time as of 7.10
+	try:
+		response = await es_client.transport.perform_request(
+			"POST",
+			f"/{config.ELASTICSEARCH_INDEX}/_pit",
+			params={"keep_alive": config.SEARCH_PIT_KEEP_ALIVE},
+		)
+	except Exception as exc:
+		raise ElasticSearchConnectionError(exc)
+
+	return response["id"]
+
+
+async def close_point_in_time(pit_id: str):
+	""" Closes a point in time once its last page has been fetched.
+		Points in time that clients abandon expire on their own.
+
+		Args:
+			pit_id: The id of the point in time
+	"""
+	try:
+		await es_client.transport.perform_request("DELETE", "/_pit", body={"id": pit_id})
+	except Exception as exc:
+		logger.warning(f"Failed to close point in time: {repr(exc)}")
+
+
+async def passthrough_search(body: bytes) -> Response:
+	""" Validates an '_msearch' body against the allow-lists in the
+		configuration and forwards it to elasticsearch unchanged, unless
+		the cost guard or the filter rewriter are enabled. The guarded
+		and rewritten items are then encoded into a new body.
+
+		The response body of elasticsearch is returned to the client
+		as it is, without being decoded and encoded again.
+
+		Args:
+			body: The raw ndjson body of the request
+
+		Returns:
+			response (fastapi.responses.Response): The json response
+	"""
+	items = parse_msearch_body(body)
+	validate_msearch_items(items)
+
+	if config.SEARCH_COST_GUARD_ENABLED:
+		items = cost_guard.guard(items)
+
+	if config.SEARCH_FILTER_REWRITE_ENABLED:
+		items = rewrite_items(items)
+
+	if config.SEARCH_COST_GUARD_ENABLED or config.SEARCH_FILTER_REWRITE_ENABLED:
+		body = b"".join(
+			dumps(line) + b"\n"
+			for item in items
+			for line in item
+		)
+
+	logger.info(f"Forwarding - {body}")
+
+	# elasticsearch requires a trailing new line in ndjson bodies
+	if not body.endswith(b"\n"):
+		body += b"\n"
+
+	# Go straight to a pooled connection, as the client itself
+	# would deserialize the response body
+	try:
+		connection = es_client.transport.get_connection()
+		_, _, data = await connection.perform_request(
+			"POST",
+			f"/{config.ELASTICSEARCH_INDEX}/_msearch",
+			body=body,
+			headers={"content-type": "application/x-ndjson"},
+		)
+	except Exception as exc:
+		raise ElasticSearchConnectionError(exc)
+
+	return Response(content=data, media_type="application/json")
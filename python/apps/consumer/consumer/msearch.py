@@ -0,0 +1,91 @@
+"""
+	Helpers for handling '_msearch' request bodies directly,
+	without rebuilding them through the elasticsearch_dsl library.
+"""
+import json
+from typing import List, Tuple
+
+from consumer import config
+from consumer.exceptions import InvalidSearchRequest
+
+
+# Header keys that have no effect on the results of a search
+IGNORED_HEADER_KEYS = ("preference", "request_cache")
+
+
+def parse_msearch_body(body: bytes) -> List[Tuple[dict, dict]]:
+	""" Splits an ndjson '_msearch' body into (header, query) pairs.
+
+		Args:
+			body: The raw ndjson body of the request
+
+		Returns:
+			items: A list of (header, query) tuples
+
+		Raises:
+			consumer.exceptions.InvalidSearchRequest
+	"""
+	try:
+		lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+	except ValueError as exc:
+		raise InvalidSearchRequest(f"Malformed ndjson body: {exc}")
+
+	if not lines or len(lines) % 2:
+		raise InvalidSearchRequest("Body must contain header/query line pairs")
+
+	items = []
+	for header, query in zip(lines[::2], lines[1::2]):
+		if not isinstance(header, dict) or not isinstance(query, dict):
+			raise InvalidSearchRequest("Header and query lines must be json objects")
+
+		items.append((header, query))
+
+	return items
+
+
+def validate_msearch_items(items: List[Tuple[dict, dict]]):
+	""" Checks the (header, query) pairs of an '_msearch' request against
+		the allow-lists defined in the configuration.
+
+		Args:
+			items: A list of (header, query) tuples
+
+		Raises:
+			consumer.exceptions.InvalidSearchRequest
+	"""
+	for header, query in items:
+		unknown_keys = set(header) - set(config.SEARCH_ALLOWED_HEADER_KEYS)
+		if unknown_keys:
+			raise InvalidSearchRequest(f"Header keys not allowed: {sorted(unknown_keys)}")
+
+		if header.get("index", config.ELASTICSEARCH_INDEX) != config.ELASTICSEARCH_INDEX:
+			raise InvalidSearchRequest(f"Index not allowed: {header['index']}")
+
+		unknown_keys = set(query) - set(config.SEARCH_ALLOWED_QUERY_KEYS)
+		if unknown_keys:
+			raise InvalidSearchRequest(f"Query keys not allowed: {sorted(unknown_keys)}")
+
+		size = query.get("size", 0)
+		if not isinstance(size, int) or not 0 <= size <= config.SEARCH_MAX_SIZE:
+			raise InvalidSearchRequest(f"Size must be between 0 and {config.SEARCH_MAX_SIZE}")
+
+
+def make_item_key(header: dict, query: dict) -> str:
+	""" Builds a normalised key for a (header, query) pair, so that
+		equivalent searches share the same key regardless of the
+		order of their keys.
+
+		Args:
+			header: The header line of the search
+			query: The query line of the search
+
+		Returns:
+			key: The normalised key of the search
+	"""
+	header = {
+		key: value for key, value in header.items()
+		if key not in IGNORED_HEADER_KEYS
+	}
+	header.setdefault("index", config.ELASTICSEARCH_INDEX)
+
+	return json.dumps([header, query], sort_keys=True, separators=(",", ":"))
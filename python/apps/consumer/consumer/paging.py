@@ -0,0 +1,160 @@
+"""
+	Cursor based paging through the results of a search template.
+
+	Instead of 'from', pages are fetched with 'search_after', out of the
+	sort values of the last hit of the previous page, against a point in
+	time of the index. Every page thus costs the same, however deep it
+	is, and is not limited by the result window of elasticsearch.
+
+	The template, its parameters, the paging mode, the point in time and
+	the sort values are handed to the client as an opaque cursor token.
+"""
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+
+from consumer import config
+from consumer.exceptions import InvalidSearchRequest
+
+
+# Paging against a point in time, or with a unique tiebreaker field
+PIT_MODE = "pit"
+TIEBREAKER_MODE = "tiebreaker"
+
+
+def get_paging_mode() -> str:
+	""" Returns the paging mode the consumer is configured with
+
+		Returns:
+			mode: PIT_MODE or TIEBREAKER_MODE
+	"""
+	return PIT_MODE if config.SEARCH_PIT_ENABLED else TIEBREAKER_MODE
+
+
+class Cursor():
+	""" The position of a client in the results of a search """
+	def __init__(self, key: str, mode: str, pit_id: Optional[str], search_after: List):
+		self.key = key
+		self.mode = mode
+		self.pit_id = pit_id
+		self.search_after = search_after
+
+	def encode(self) -> str:
+		""" Encodes the cursor into an opaque token
+
+			Returns:
+				token: The token of the cursor
+		"""
+		data = json.dumps(
+			{"key": self.key, "mode": self.mode, "pit": self.pit_id, "after": self.search_after},
+			separators=(",", ":"),
+		)
+
+		return base64.urlsafe_b64encode(data.encode()).decode()
+
+	@classmethod
+	def decode(cls, token: str) -> "Cursor":
+		""" Decodes a token back into a cursor
+
+			Args:
+				token: The token of the cursor, as sent by the client
+
+			Returns:
+				cursor: The decoded cursor
+
+			Raises:
+				consumer.exceptions.InvalidSearchRequest
+		"""
+		try:
+			data = json.loads(base64.urlsafe_b64decode(token.encode()))
+			key, mode, pit_id, search_after = data["key"], data["mode"], data["pit"], data["after"]
+		except (binascii.Error, ValueError, TypeError, KeyError):
+			raise InvalidSearchRequest("Invalid cursor")
+
+		if (
+			not isinstance(key, str)
+			or (mode, type(pit_id)) not in ((PIT_MODE, str), (TIEBREAKER_MODE, type(None)))
+			or not isinstance(search_after, list)
+			or not all(isinstance(value, (str, int, float, type(None))) for value in search_after)
+		):
+			raise InvalidSearchRequest("Invalid cursor")
+
+		return cls(key, mode, pit_id, search_after)
+
+
+def get_template_search(key: str) -> Tuple[str, dict]:
+	""" Returns the name and parameters of a template key
+
+		Args:
+			key: A key as returned by templates.render_template
+
+		Returns:
+			name: The name of the template
+			params: The parameters of the template
+
+		Raises:
+			consumer.exceptions.InvalidSearchRequest
+	"""
+	try:
+		name, params = json.loads(key)
+	except (ValueError, TypeError):
+		raise InvalidSearchRequest("Invalid cursor")
+
+	if not isinstance(name, str) or not isinstance(params, dict):
+		raise InvalidSearchRequest("Invalid cursor")
+
+	return name, params
+
+
+def build_page_query(query: dict, pit_id: Optional[str], search_after: Optional[List]) -> dict:
+	""" Builds the query of a page out of the query of a template
+
+		Args:
+			query: The query of the template. Shared, not modified
+			pit_id: The point in time to search against, if any
+			search_after: The sort values of the last hit of the previous page, if any
+
+		Returns:
+			query: The query of the page
+	"""
+	query = dict(query)
+	query.pop("from", None)
+
+	sort = list(query.get("sort", ["_score"]))
+	if pit_id is None:
+		# Points in time break ties by shard and document on their own
+		sort.append({config.SEARCH_PAGING_TIEBREAKER: {"order": "asc"}})
+	query["sort"] = sort
+
+	if pit_id is not None:
+		query["pit"] = {"id": pit_id, "keep_alive": config.SEARCH_PIT_KEEP_ALIVE}
+
+	if search_after is not None:
+		query["search_after"] = search_after
+		# Totals are only counted once, on the first page
+		query["track_total_hits"] = False
+
+	if config.SEARCH_COST_GUARD_ENABLED:
+		query["timeout"] = config.SEARCH_TIMEOUT
+
+	return query
+
+
+def get_next_cursor(key: str, response: dict, size: int) -> Optional[Cursor]:
+	""" Returns the cursor of the page after the one of a response
+
+		Args:
+			key: The template key of the search
+			response: The elasticsearch response of a page
+			size: The size of the page
+
+		Returns:
+			cursor: The cursor of the next page, None if this was the last page
+	"""
+	hits = response["hits"]["hits"]
+
+	if not hits or len(hits) < size:
+		return None
+
+	return Cursor(key, get_paging_mode(), response.get("pit_id"), hits[-1]["sort"])
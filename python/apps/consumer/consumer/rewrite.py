@@ -0,0 +1,182 @@
+"""
+	Rewrites the '_msearch' items of the frontend, so that elasticsearch
+	can cache the parts of them that do not affect scoring.
+
+	Clauses on exact values (category, ids) and on rating ranges are
+	moved from the scoring 'must' context of their bool query into its
+	'filter' context, where elasticsearch keeps their matches in bitsets
+	that are reused across searches. Items that only ask for
+	aggregations are marked for the shard request cache.
+"""
+from typing import List, Tuple, Union
+
+from consumer import config
+
+
+# Leaf clauses that match exact values, when on one of the term fields
+TERM_CLAUSES = ("match", "match_phrase", "term", "terms")
+
+# Values of minimum_should_match that require any one should clause
+ANY_SHOULD = (None, 1, "1")
+
+BOOL_OCCURRENCES = ("must", "filter", "should", "must_not")
+
+
+def rewrite_items(items: List[Tuple[dict, dict]]) -> List[Tuple[dict, dict]]:
+	""" Rewrites the items of an '_msearch' request. The items are not
+		modified, rewritten copies of them are returned instead.
+
+		Args:
+			items: A list of (header, query) tuples
+
+		Returns:
+			items: The rewritten (header, query) tuples
+	"""
+	rewritten_items = []
+	for header, query in items:
+		query = dict(query)
+
+		if isinstance(query.get("query"), dict):
+			query["query"] = rewrite_query(query["query"])
+
+		if query.get("size") == 0 and (query.get("aggs") or query.get("aggregations")):
+			header = dict(header, request_cache=True)
+
+		rewritten_items.append((header, query))
+
+	return rewritten_items
+
+
+def rewrite_query(clause: dict) -> dict:
+	""" Rewrites the top level clause of a query
+
+		Args:
+			clause: The top level clause
+
+		Returns:
+			clause: The rewritten clause
+	"""
+	clause = rewrite_clause(clause)
+
+	if not is_non_scoring(clause) or is_filter_bool(clause):
+		return clause
+
+	return {"bool": {"filter": [clause]}}
+
+
+def rewrite_clause(clause: dict) -> dict:
+	""" Moves the non scoring clauses of the 'must' context of (nested)
+		bool queries into their 'filter' context.
+
+		Args:
+			clause: A query clause
+
+		Returns:
+			clause: The rewritten clause
+	"""
+	if not isinstance(clause, dict) or not isinstance(clause.get("bool"), dict):
+		return clause
+
+	bool_query = dict(clause["bool"])
+
+	for occurrence in BOOL_OCCURRENCES:
+		if occurrence in bool_query:
+			bool_query[occurrence] = [
+				rewrite_clause(child)
+				for child in get_clauses(bool_query[occurrence])
+			]
+
+	must = bool_query.pop("must", [])
+	moved = [child for child in must if is_non_scoring(child)]
+
+	if moved:
+		bool_query["filter"] = bool_query.get("filter", []) + moved
+
+	must = [child for child in must if not is_non_scoring(child)]
+	if must:
+		bool_query["must"] = must
+
+	return dict(clause, bool=bool_query)
+
+
+def is_non_scoring(clause: dict) -> bool:
+	""" Checks whether a clause only filters documents, either because it
+		matches exact values or because it is a bool query whose clauses
+		all do.
+
+		Args:
+			clause: A query clause
+
+		Returns:
+			non_scoring: Whether the clause can go in filter context
+	"""
+	if not isinstance(clause, dict) or len(clause) != 1:
+		return False
+
+	(clause_type, body), = clause.items()
+
+	if not isinstance(body, dict):
+		return False
+
+	if clause_type == "ids":
+		return True
+
+	if clause_type in TERM_CLAUSES:
+		return len(body) == 1 and set(body) <= set(config.SEARCH_FILTER_TERM_FIELDS)
+
+	if clause_type == "range":
+		return len(body) == 1 and set(body) <= set(config.SEARCH_FILTER_RANGE_FIELDS)
+
+	if clause_type == "bool":
+		if get_clauses(body.get("must")):
+			return False
+
+		should = get_clauses(body.get("should"))
+		if not should:
+			return True
+
+		# Should clauses are optional, and thus only score, next to filters
+		return (
+			not get_clauses(body.get("filter"))
+			and body.get("minimum_should_match") in ANY_SHOULD
+			and all(is_non_scoring(child) for child in should)
+		)
+
+	return False
+
+
+def is_filter_bool(clause: dict) -> bool:
+	""" Checks whether a clause is a bool query with filter clauses only
+
+		Args:
+			clause: A query clause
+
+		Returns:
+			filter_bool: Whether the clause is a filter only bool query
+	"""
+	body = clause.get("bool")
+
+	return (
+		isinstance(body, dict)
+		and bool(get_clauses(body.get("filter")))
+		and not any(get_clauses(body.get(occurrence)) for occurrence in ("must", "should"))
+	)
+
+
+def get_clauses(clauses: Union[dict, list, None]) -> list:
+	""" Returns the clauses of a bool occurrence, which elasticsearch
+		accepts both as a single clause and as a list.
+
+		Args:
+			clauses: The clause(s) of the occurrence
+
+		Returns:
+			clauses: The list of clauses
+	"""
+	if clauses is None:
+		return []
+
+	if isinstance(clauses, dict):
+		return [clauses]
+
+	return list(clauses)
@@ -0,0 +1,100 @@
+"""
+	De-duplication of identical '_msearch' items that are sent
+	to elasticsearch by concurrent requests.
+"""
+import asyncio
+from typing import Awaitable, Optional
+
+from consumer.exceptions import ElasticSearchConnectionError
+
+
+class SingleFlight():
+	""" Tracks the '_msearch' items that have been sent to elasticsearch
+		and are still waiting for a response, so that identical items of
+		concurrent requests await that response instead of being sent
+		again.
+	"""
+	def __init__(self):
+		self.coalesced = 0
+		self._futures = {}
+		# The event loop only keeps weak references to tasks
+		self._tasks = set()
+
+	def get(self, key: str) -> Optional[asyncio.Future]:
+		""" Returns the pending response of a search, if an identical
+			one is already in flight.
+
+			Args:
+				key: The normalised key of the search
+
+			Returns:
+				future: The future that resolves to the response
+		"""
+		future = self._futures.get(key)
+
+		if future is not None:
+			self.coalesced += 1
+
+		return future
+
+	def start(self, key: str):
+		""" Marks a search as in flight.
+
+			Args:
+				key: The normalised key of the search
+		"""
+		self._futures[key] = asyncio.get_event_loop().create_future()
+
+	def finish(self, key: str, response: Optional[dict]):
+		""" Hands the response of a search to every request waiting for it.
+
+			Args:
+				key: The normalised key of the search
+				response: The elasticsearch response, None if the search failed
+		"""
+		future = self._futures.pop(key, None)
+
+		if future is not None and not future.done():
+			future.set_result(response)
+
+	async def run(self, work: Awaitable):
+		""" Runs the work of the request that leads some searches, in a
+			task that is owned by the flight. A cancelled leader thus does
+			not cancel the searches that other requests are waiting for.
+
+			Args:
+				work: The work of the leading request
+		"""
+		task = asyncio.ensure_future(work)
+		self._tasks.add(task)
+		task.add_done_callback(self._discard_task)
+
+		await asyncio.shield(task)
+
+	def _discard_task(self, task: asyncio.Task):
+		self._tasks.discard(task)
+
+		# Retrieved, even if the leading request has gone away
+		if not task.cancelled():
+			task.exception()
+
+	async def wait(self, future: asyncio.Future) -> dict:
+		""" Waits for the response of a search that is in flight.
+
+			Args:
+				future: The future returned by get()
+
+			Returns:
+				response: The elasticsearch response of the search
+
+			Raises:
+				consumer.exceptions.ElasticSearchConnectionError
+		"""
+		# Shielded, so that a cancelled request does not cancel
+		# the response for every other request waiting on it
+		response = await asyncio.shield(future)
+
+		if response is None:
+			raise ElasticSearchConnectionError("Coalesced search failed")
+
+		return response
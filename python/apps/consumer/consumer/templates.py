@@ -0,0 +1,175 @@
+"""
+	Named, parameterised searches that are owned by the server.
+
+	Clients send the name of a template along with its parameters,
+	instead of raw elasticsearch DSL. The templates are compiled once,
+	when the module is loaded, and the rendered bodies are cached by
+	their (small and deterministic) template key.
+"""
+from functools import lru_cache
+import json
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, ValidationError, conint, conlist, constr
+
+from consumer import config
+from consumer.exceptions import InvalidSearchRequest
+
+
+# Fields of the title, as per the index template of elasticsearch
+TITLE_FIELDS = ["title", "title.english"]
+
+
+class TemplateParams(BaseModel):
+	""" Parameters shared by all the templates """
+	size: conint(ge=0, le=config.SEARCH_MAX_SIZE) = 10
+	from_: conint(ge=0, le=config.SEARCH_MAX_RESULT_WINDOW) = Field(0, alias="from")
+
+	class Config:
+		allow_population_by_field_name = True
+		extra = "forbid"
+
+
+class CategoryBrowseParams(TemplateParams):
+	categories: conlist(constr(min_length=1, max_length=50), min_items=1, max_items=20)
+
+
+class TitleSearchParams(TemplateParams):
+	text: constr(min_length=1, max_length=200)
+	categories: Optional[conlist(constr(min_length=1, max_length=50), min_items=1, max_items=20)]
+
+
+class TopRatedParams(TemplateParams):
+	categories: Optional[conlist(constr(min_length=1, max_length=50), min_items=1, max_items=20)]
+
+
+def get_category_filter(categories: Optional[List[str]]) -> List[dict]:
+	""" Builds the (non scoring) filter clauses of the selected categories
+
+		Args:
+			categories: The selected categories, if any
+
+		Returns:
+			filters: The filter clauses
+	"""
+	if not categories:
+		return []
+
+	return [{"terms": {"category": sorted(categories)}}]
+
+
+def build_category_browse(params: CategoryBrowseParams) -> dict:
+	return {
+		"query": {"bool": {"filter": get_category_filter(params.categories)}},
+		"size": params.size,
+		"from": params.from_,
+	}
+
+
+def build_title_search(params: TitleSearchParams) -> dict:
+	return {
+		"query": {
+			"bool": {
+				"must": [{"multi_match": {"query": params.text, "fields": TITLE_FIELDS}}],
+				"filter": get_category_filter(params.categories),
+			},
+		},
+		"size": params.size,
+		"from": params.from_,
+	}
+
+
+def build_top_rated(params: TopRatedParams) -> dict:
+	return {
+		"query": {"bool": {"filter": get_category_filter(params.categories)}},
+		"sort": [
+			{"rating.positive": {"order": "desc"}},
+			{"rating.negative": {"order": "asc"}},
+		],
+		"size": params.size,
+		"from": params.from_,
+	}
+
+
+class SearchTemplate:
+	""" A named search, which builds an elasticsearch query
+		out of validated parameters.
+	"""
+	def __init__(self, name: str, params_model: Type[TemplateParams], build: Callable[[BaseModel], dict]):
+		self.name = name
+		self.params_model = params_model
+		self.build = build
+
+	def validate_params(self, params: dict) -> TemplateParams:
+		""" Validates the parameters of a search
+
+			Args:
+				params: The parameters as sent by the client
+
+			Returns:
+				params: The validated parameters
+
+			Raises:
+				consumer.exceptions.InvalidSearchRequest
+		"""
+		try:
+			return self.params_model(**params)
+		except ValidationError as exc:
+			raise InvalidSearchRequest(f"Invalid parameters of template '{self.name}': {exc}")
+
+
+# All the available templates, by name
+SEARCH_TEMPLATES: Dict[str, SearchTemplate] = {
+	template.name: template
+	for template in [
+		SearchTemplate("category_browse", CategoryBrowseParams, build_category_browse),
+		SearchTemplate("title_search", TitleSearchParams, build_title_search),
+		SearchTemplate("top_rated", TopRatedParams, build_top_rated),
+	]
+}
+
+
+def render_template(name: str, params: dict) -> Tuple[str, dict, dict]:
+	""" Renders a named template into an '_msearch' item
+
+		Args:
+			name: The name of the template
+			params: The parameters as sent by the client
+
+		Returns:
+			key: A key that identifies the search, i.e for caching its response
+			header: The header of the '_msearch' item
+			query: The query of the '_msearch' item. Shared, must not be modified
+
+		Raises:
+			consumer.exceptions.InvalidSearchRequest
+	"""
+	template = SEARCH_TEMPLATES.get(name)
+	if template is None:
+		raise InvalidSearchRequest(f"Unknown search template '{name}'")
+
+	validated_params = template.validate_params(params)
+
+	key = json.dumps(
+		[name, validated_params.dict(by_alias=True)],
+		sort_keys=True,
+		separators=(",", ":"),
+	)
+
+	return key, {"index": config.ELASTICSEARCH_INDEX}, build_query(key)
+
+
+@lru_cache(maxsize=config.SEARCH_TEMPLATE_CACHE_MAXSIZE)
+def build_query(key: str) -> dict:
+	""" Builds (once) the query of a template key
+
+		Args:
+			key: A key as returned by render_template
+
+		Returns:
+			query: The query of the template
+	"""
+	name, params = json.loads(key)
+	template = SEARCH_TEMPLATES[name]
+
+	return template.build(template.params_model(**params))
@@ -0,0 +1,94 @@
+"""
+	Benchmark of reading reference documents into models.
+
+	Builds reference documents of a number of books, each of a number of
+	sections, as they are read from the database, and times building the
+	Reference model out of them:
+
+		validated: Reference(**document), i.e TRUSTED_READS=false (before)
+		hydrated: hydrate(Reference, document)
+
+	Run from the producer directory, i.e
+
+		python benchmarks/hydrate_references.py --books 50 --sections 100
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+
+def get_document(books: int, sections: int) -> dict:
+	""" Builds a reference document, as projected out of the database
+
+		Args:
+			books: The number of books of the reference
+			sections: The number of sections of every book
+
+		Returns:
+			document: A reference document
+	"""
+	return dict(
+		reference_id="00000000-0000-0000-0000-000000000000",
+		title="A reference to benchmark",
+		category="history",
+		description="A description of the reference to benchmark",
+		books=[
+			dict(
+				name=f"Book number {book}",
+				author=f"Author number {book}",
+				book_sections=[dict(starting_page=page, ending_page=page + 1) for page in range(1, sections + 1)],
+				book_links=[dict(link_type="amazon", link_url=f"https://www.amazon.com/{book}")],
+			)
+			for book in range(books)
+		],
+		rating=dict(positive=10, negative=2),
+	)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--books", type=int, default=50)
+	parser.add_argument("--sections", type=int, default=100)
+	parser.add_argument("--repeat", type=int, default=20)
+	args = parser.parse_args()
+
+	# The configuration of the service is read from the environment on import
+	for key, value in dict(
+		APP_NAME="producer",
+		LOCAL_DEPLOYMENT="true",
+		DATABASE_TYPE="mongodb",
+		DATABASE_HOST="localhost",
+		DATABASE_PORT="27017",
+		DATABASE_NAME="producer-benchmarks",
+	).items():
+		os.environ.setdefault(key, value)
+	sys.path.insert(0, os.getcwd())
+
+	# contextlog expects logging.handlers to be imported already, as uvicorn does
+	import logging.handlers  # noqa: F401
+
+	from mongoindexes import hydrate
+	from producer.models.db_models import Reference
+
+	document = get_document(args.books, args.sections)
+
+	# Both build the same reference
+	assert hydrate(Reference, document).dict() == Reference(**document).dict()
+
+	results = {"books": args.books, "sections": args.sections}
+	for name, build in (
+		("validated", lambda: Reference(**document)),
+		("hydrated", lambda: hydrate(Reference, document)),
+	):
+		best = min(timeit.repeat(build, number=1, repeat=args.repeat))
+		results[f"{name}_ms"] = round(best * 1000, 3)
+
+	results["speedup"] = round(results["validated_ms"] / results["hydrated_ms"], 1)
+
+	print(json.dumps(results))
+
+
+if __name__ == "__main__":
+	main()
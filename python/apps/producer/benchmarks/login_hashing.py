@@ -0,0 +1,150 @@
+"""
+	Benchmark of the login callbacks of the producer under concurrency.
+
+	Runs the part of a login callback that the producer does itself,
+	i.e looking the user up by their hashed external subject id and
+	creating them when they are new, for concurrent first time logins,
+	against mongomock. The exchange of tokens with the external provider
+	is left out.
+
+	Meanwhile a ticker wakes up every 10ms, as any other request of the
+	producer would, and its lag measures how long the event loop stalls.
+
+	The hashing is run in one of the modes:
+
+		inline: On the event loop, and twice per new user (before)
+		threads: In a pool of threads (HASHING_USE_PROCESSES=false)
+		processes: In a pool of processes (the default)
+
+	Run from the producer directory, i.e
+
+		python benchmarks/login_hashing.py --logins 40 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+TICK_SECONDS = 0.01
+MODES = ("inline", "threads", "processes")
+
+
+def percentile(values: list, fraction: float) -> float:
+	values = sorted(values)
+	return values[max(int(len(values) * fraction) - 1, 0)]
+
+
+async def run_logins(args: argparse.Namespace) -> dict:
+	""" Runs the concurrent logins and measures them
+
+		Args:
+			args: The command line arguments
+
+		Returns:
+			results: The measurements
+	"""
+	from mongomock_motor import AsyncMongoMockClient
+
+	from producer import config, db_client
+	from producer import db_clients
+	from producer.models.auth_models import ExternalUser
+
+	db = AsyncMongoMockClient()[config.MONGODB_DATABASE]
+	db_client._db = db
+	db_client._reference_manager_coll = db[config.MONGODB_REFERENCE_MANAGER_COLLECTION]
+	db_client._users_coll = db["users"]
+
+	if args.mode == "inline":
+		async def encrypt_inline(external_user: ExternalUser) -> str:
+			# As before, hashed on the event loop on every call
+			return db_clients.hash_external_sub_id(external_user.external_sub_id, external_user.email)
+
+		db_client._encrypt_external_sub_id = encrypt_inline
+
+	# Warms the pool up, so that starting workers is not measured
+	await db_client._encrypt_external_sub_id(ExternalUser(email="warm@up", username="warm", external_sub_id="0"))
+
+	lags = []
+	done = asyncio.Event()
+
+	async def tick():
+		while not done.is_set():
+			start = time.perf_counter()
+			await asyncio.sleep(TICK_SECONDS)
+			lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+	latencies = []
+	semaphore = asyncio.Semaphore(args.concurrency)
+
+	async def login(i: int):
+		external_user = ExternalUser(email=f"user-{i}@example.com", username=f"user-{i}", external_sub_id=str(i))
+		async with semaphore:
+			start = time.perf_counter()
+			internal_user = await db_client.get_user_by_external_sub_id(external_user)
+			if internal_user is None:
+				await db_client.create_internal_user(external_user)
+			latencies.append(time.perf_counter() - start)
+
+	ticker = asyncio.ensure_future(tick())
+
+	start = time.perf_counter()
+	await asyncio.gather(*[login(i) for i in range(args.logins)])
+	elapsed = time.perf_counter() - start
+
+	done.set()
+	await ticker
+	db_clients.hashing_executor.shutdown()
+
+	return {
+		"mode": args.mode,
+		"logins": args.logins,
+		"concurrency": args.concurrency,
+		"pool_size": config.HASHING_POOL_SIZE,
+		"logins_per_second": round(args.logins / elapsed, 1),
+		"p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+		"p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+		"loop_lag_p99_ms": round(percentile(lags, 0.99) * 1000, 1),
+		"loop_lag_max_ms": round(max(lags) * 1000, 1),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--logins", type=int, default=40)
+	parser.add_argument("--concurrency", type=int, default=20)
+	parser.add_argument("--mode", choices=MODES, help="Runs a single mode, all of them otherwise")
+	args = parser.parse_args()
+
+	if args.mode is None:
+		# Every mode in its own process, as the pool is picked on import
+		for mode in MODES:
+			subprocess.run([sys.executable, __file__, *sys.argv[1:], "--mode", mode], check=True)
+		return
+
+	# The configuration of the service is read from the environment on import
+	for key, value in dict(
+		APP_NAME="producer",
+		LOCAL_DEPLOYMENT="true",
+		DATABASE_TYPE="mongodb",
+		DATABASE_HOST="localhost",
+		DATABASE_PORT="27017",
+		DATABASE_NAME="producer-benchmarks",
+	).items():
+		os.environ.setdefault(key, value)
+	os.environ["HASHING_USE_PROCESSES"] = "true" if args.mode == "processes" else "false"
+	sys.path.insert(0, os.getcwd())
+
+	# contextlog expects logging.handlers to be imported already, as uvicorn does
+	import logging.handlers  # noqa: F401
+	logging.disable(logging.INFO)
+
+	results = asyncio.get_event_loop().run_until_complete(run_logins(args))
+
+	print(json.dumps(results))
+
+
+if __name__ == "__main__":
+	main()
@@ -1,7 +1,7 @@
-from aiocache import Cache
 import sentry_sdk
 
 from producer import config
+from producer.cache_clients import get_cache_client
 from producer.db_clients import get_db_client
 
 
@@ -10,6 +10,6 @@ if config.SENTRY_ENABLED:
 	sentry_sdk.init(config.SENTRY_ENDPOINT)
 
 # Initialize cache
-cache = Cache()
+cache = get_cache_client(config.CACHE_TYPE)
 # Initialize db client
-db_client = get_db_client((config.DATABASE_TYPE))
+db_client = get_db_client(config.DATABASE_TYPE, cache)
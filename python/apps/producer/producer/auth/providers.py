@@ -1,11 +1,14 @@
-import json
-import requests
+import asyncio
+from email.utils import parsedate_to_datetime
+import time
 
 from abc import ABC, abstractmethod
 
 from fastapi import HTTPException
+import httpx
 from msal import ConfidentialClientApplication
 from oauthlib.oauth2 import WebApplicationClient
+from oauthlib.oauth2.rfc6749.parameters import parse_token_response
 from starlette.responses import RedirectResponse
 
 from contextlog import contextlog
@@ -26,6 +29,15 @@ from producer.auth.util import create_state_csrf_token
 
 logger = contextlog.get_contextlog()
 
+# Providers are only instantiated once per process
+auth_providers = {}
+
+# Pooled HTTP client for talking to the providers. Created on first use
+http_client = None
+
+# Discovery documents by URL, along with the time they expire
+discovery_documents = {}
+
 
 async def get_auth_provider(auth_provider: str):
 	""" Works out the correct authentication provider that needs
@@ -35,16 +47,109 @@ async def get_auth_provider(auth_provider: str):
 		Raises:
 			producer.exceptions.UnknownAuthenticationProvider
 	"""
+	if auth_provider in auth_providers:
+		return auth_providers[auth_provider]
+
 	for provider_cls in AuthProvider.__subclasses__():
 		try:
 			if await provider_cls.meets_condition(auth_provider):
-				return provider_cls(client_id=provider_cls.client_id)
+				auth_providers[auth_provider] = provider_cls(client_id=provider_cls.client_id)
+				return auth_providers[auth_provider]
 		except KeyError:
 			continue
 
 	raise UnknownAuthenticationProvider(auth_provider)
 
 
+def get_http_client() -> httpx.AsyncClient:
+	""" Returns the pooled HTTP client that is shared by the providers """
+	global http_client
+
+	if http_client is None:
+		http_client = httpx.AsyncClient(
+			timeout=config.AUTH_HTTP_TIMEOUT_SECONDS,
+			limits=httpx.Limits(max_connections=config.AUTH_HTTP_MAX_CONNECTIONS),
+		)
+
+	return http_client
+
+
+async def close_http_client():
+	""" Closes the pooled HTTP client, if it was ever created """
+	global http_client
+
+	if http_client is not None:
+		await http_client.aclose()
+		http_client = None
+
+
+async def get_discovery_document(discovery_url: str) -> dict:
+	""" Returns the OpenId configuration document found at a URL.
+
+		Documents are cached for as long as the Cache-Control or
+		Expires headers of the response allow, or for the default
+		TTL in the configuration if there are no such headers.
+
+		Args:
+			discovery_url: The URL of the discovery document
+
+		Returns:
+			discovery_document: The configuration dictionary
+	"""
+	cached = discovery_documents.get(discovery_url)
+	if cached and cached[0] > time.monotonic():
+		return cached[1]
+
+	response = await get_http_client().get(discovery_url)
+	response.raise_for_status()
+	discovery_document = response.json()
+
+	ttl = get_cache_ttl(response.headers)
+	if ttl > 0:
+		discovery_documents[discovery_url] = (time.monotonic() + ttl, discovery_document)
+
+	return discovery_document
+
+
+def get_cache_ttl(headers: httpx.Headers) -> int:
+	""" Works out for how many seconds a response may be cached,
+		based on its HTTP cache headers.
+
+		Args:
+			headers: The headers of the response
+
+		Returns:
+			ttl: Seconds to cache the response for
+	"""
+	cache_control = [
+		directive.strip().lower()
+		for directive in headers.get("cache-control", "").split(",")
+	]
+
+	if "no-store" in cache_control or "no-cache" in cache_control:
+		return 0
+
+	for directive in cache_control:
+		if directive.startswith("max-age="):
+			try:
+				max_age = int(directive[len("max-age="):])
+				age = int(headers.get("age", 0))
+			except ValueError:
+				break
+
+			return max(max_age - age, 0)
+
+	if "expires" in headers:
+		try:
+			expires = parsedate_to_datetime(headers["expires"]).timestamp()
+		except (TypeError, ValueError):
+			return 0
+
+		return max(int(expires - time.time()), 0)
+
+	return config.DISCOVERY_DOCUMENT_TTL_SECONDS
+
+
 class AuthProvider(ABC):
 	""" Authentication providers interface """
 	def __init__(self, client_id: str):
@@ -117,21 +222,25 @@ class GoogleAuthProvider(AuthProvider):
 		)
 
 		try:
-			token_response = requests.post(
+			token_response = await get_http_client().post(
 				token_url,
 				headers=headers,
-				data=body,
+				content=body,
 				auth=(config.GOOGLE_CLIENT_ID, config.GOOGLE_CLIENT_SECRET),
 			)
 
-			self.auth_client.parse_request_body_response(json.dumps(token_response.json()))
+			# The auth client is shared between requests, so the token
+			# is parsed without being stored on it
+			token = parse_token_response(token_response.text)
 
 		except Exception as exc:
 			raise ProviderConnectionError(f"Could not get Google's access token: {repr(exc)}")
 
 		# Request user's information from Google
-		uri, headers, body = self.auth_client.add_token(userinfo_endpoint)
-		userinfo_response = requests.get(uri, headers=headers, data=body)
+		userinfo_response = await get_http_client().get(
+			userinfo_endpoint,
+			headers={'Authorization': 'Bearer ' + token['access_token']},
+		)
 
 		if userinfo_response.json().get("email_verified"):
 			email = userinfo_response.json()["email"]
@@ -179,7 +288,7 @@ class GoogleAuthProvider(AuthProvider):
 				discovery_document: The configuration dictionary
 		"""
 		try:
-			discovery_document = requests.get(config.GOOGLE_DISCOVERY_URL).json()
+			discovery_document = await get_discovery_document(config.GOOGLE_DISCOVERY_URL)
 		except Exception as exc:
 			raise ProviderConnectionError(f"Could not get Google's discovery document: {repr(exc)}")
 
@@ -192,10 +301,36 @@ class AzureAuthProvider(AuthProvider):
 	"""
 	client_id = config.AZURE_CLIENT_ID
 
+	def __init__(self, client_id: str):
+		super(AzureAuthProvider, self).__init__(client_id)
+		self._msal_client = None
+
 	@staticmethod
 	async def meets_condition(auth_provider):
 		return auth_provider == config.AZURE
 
+	async def _get_msal_client(self) -> ConfidentialClientApplication:
+		""" Returns the MSAL client of the provider, creating it on first use.
+
+			Creating the client contacts Azure's authority, so it
+			is done once per process and off the event loop.
+
+			Returns:
+				msal_client: The MSAL confidential client
+		"""
+		if self._msal_client is None:
+			loop = asyncio.get_event_loop()
+			self._msal_client = await loop.run_in_executor(
+				None,
+				lambda: ConfidentialClientApplication(
+					config.AZURE_CLIENT_ID,
+					authority=config.AZURE_AUTHORITY,
+					client_credential=config.AZURE_CLIENT_SECRET
+				),
+			)
+
+		return self._msal_client
+
 	async def get_user(self, auth_token: ExternalAuthToken) -> ExternalUser:
 		# Get Azure's endpoints from discovery document
 		discovery_document = await self._get_discovery_document()
@@ -205,18 +340,18 @@ class AzureAuthProvider(AuthProvider):
 		except KeyError as exc:
 			raise DiscoveryDocumentError(f"Could not parse Azure's discovery document: {repr(exc)}")
 
-		msal_client = ConfidentialClientApplication(
-			config.AZURE_CLIENT_ID,
-			authority=config.AZURE_AUTHORITY,
-			client_credential=config.AZURE_CLIENT_SECRET
-		)
+		msal_client = await self._get_msal_client()
 
-		# Request access_token from Azure
+		# Request access_token from Azure. MSAL only offers blocking calls
 		try:
-			result = msal_client.acquire_token_by_authorization_code(
-				auth_token.code,
-				redirect_uri=config.AZURE_REDIRECT_URL,
-				scopes=["User.Read"],
+			loop = asyncio.get_event_loop()
+			result = await loop.run_in_executor(
+				None,
+				lambda: msal_client.acquire_token_by_authorization_code(
+					auth_token.code,
+					redirect_uri=config.AZURE_REDIRECT_URL,
+					scopes=["User.Read"],
+				),
 			)
 
 			access_token = result['access_token']
@@ -225,7 +360,7 @@ class AzureAuthProvider(AuthProvider):
 			raise ProviderConnectionError(f"Could not get Azure's access token: {repr(exc)}")
 
 		# Request user's information from Azure
-		userinfo_response = requests.get(
+		userinfo_response = await get_http_client().get(
 			# Currently userinfo_endpoint only returns "sub". We need to use /v1.0/users for other info
 			"https://graph.microsoft.com/v1.0/users",
 			headers={'Authorization': 'Bearer ' + access_token}
@@ -249,11 +384,7 @@ class AzureAuthProvider(AuthProvider):
 		return external_user
 
 	async def get_request_uri(self) -> str:
-		msal_client = ConfidentialClientApplication(
-			config.AZURE_CLIENT_ID,
-			authority=config.AZURE_AUTHORITY,
-			client_credential=config.AZURE_CLIENT_SECRET
-		)
+		msal_client = await self._get_msal_client()
 
 		state_csrf_token = await create_state_csrf_token()
 
@@ -277,7 +408,7 @@ class AzureAuthProvider(AuthProvider):
 				discovery_document: The configuration dictionary
 		"""
 		try:
-			discovery_document = requests.get(config.AZURE_DISCOVERY_URL).json()
+			discovery_document = await get_discovery_document(config.AZURE_DISCOVERY_URL)
 		except Exception as exc:
 			raise ProviderConnectionError(f"Could not get Azure's discovery document: {repr(exc)}")
 
@@ -36,7 +36,11 @@ async def create_state_csrf_token() -> str:
 	state_csrf_token = hashlib.sha256(os.urandom(1024)).hexdigest()
 
 	# Values not necessary. We only need to check for existence
-	await cache.set(state_csrf_token, {"valid": True})
+	await cache.set(
+		state_csrf_token,
+		{"valid": True},
+		ttl=config.STATE_TOKEN_EXPIRE_MINUTES * 60,
+	)
 
 	return state_csrf_token
 
@@ -52,14 +56,13 @@ async def validate_state_csrf_token(state_csrf_token: str, state_csrf_token_cook
 	if state_csrf_token != state_csrf_token_cookie:
 		raise UnauthorizedUser(f"Failed to validate state token")
 
-	# Also, check that we 100% cached that token in the past
-	cached_token = await cache.get(state_csrf_token)
+	# Also, check that we 100% cached that token in the past.
+	# Popped atomically, so that the token can only be used once
+	cached_token = await cache.pop(state_csrf_token)
 
 	if not cached_token:
 		raise UnauthorizedUser(f"Failed to validate against cached state token")
 
-	await cache.delete(state_csrf_token)
-
 
 async def create_internal_auth_token(internal_user: InternalUser) -> InternalAuthToken:
 	""" Creates a one time JWT authentication token to return to the user.
@@ -86,7 +89,11 @@ async def create_internal_auth_token(internal_user: InternalUser) -> InternalAut
 	).decode('utf-8')
 
 	# Add token/user pair in the cache
-	await cache.set(encoded_jwt, internal_user.internal_sub_id)
+	await cache.set(
+		encoded_jwt,
+		internal_user.internal_sub_id,
+		ttl=config.AUTH_TOKEN_EXPIRE_MINUTES * 60,
+	)
 
 	return encoded_jwt
 
@@ -107,14 +114,12 @@ async def validate_internal_auth_token(internal_auth_token: str) -> InternalUser
 	except PyJWTError as exc:
 		raise UnauthorizedUser(f"Failed to validate auth token: {exc}")
 
-	internal_sub_id = await cache.get(internal_auth_token)
+	# Popped atomically. Authentication token can only be used once
+	internal_sub_id = await cache.pop(internal_auth_token)
 
 	if not internal_sub_id:
 		raise UnauthorizedUser(f"User {internal_sub_id} not cached")
 
-	# Invalidate cache. Authentication token can only be used once
-	await cache.delete(internal_auth_token)
-
 	internal_user = await db_client.get_user_by_internal_sub_id(internal_sub_id)
 
 	return internal_user
@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+import json
+import time
+from typing import Any, Optional
+
+from redis import asyncio as aioredis
+
+from contextlog import contextlog
+from producer import config
+from producer.exceptions import UnknownCacheType
+
+
+logger = contextlog.get_contextlog()
+
+def get_cache_client(cache_type):
+	""" Works out the correct cache client based on
+		the cache type provided in the configuration
+
+		Raises:
+			producer.exceptions.UnknownCacheType
+	"""
+	for client_cls in CacheClient.__subclasses__():
+		try:
+			if client_cls.meets_condition(cache_type):
+				return client_cls()
+		except KeyError:
+			continue
+
+	raise UnknownCacheType(cache_type)
+
+
+class CacheClient(ABC):
+	""" Cache client interface.
+
+		Values must be json serializable, so that every
+		implementation can store them the same way.
+	"""
+
+	@abstractmethod
+	def meets_condition(cache_type: str):
+		""" Checks whether this type of cache client matches
+			the one defined in the configuration.
+
+			Makes sure the correct client will be instantiated.
+
+			Args:
+				cache_type: One of cache types as defined in config
+		"""
+		...
+
+	@abstractmethod
+	async def close_connection(self):
+		""" Closes a connection to the cache """
+		...
+
+	@abstractmethod
+	async def set(self, key: str, value: Any, ttl: int):
+		""" Adds a value to the cache.
+
+			Args:
+				key: The key of the value
+				value: A json serializable value
+				ttl: Seconds after which the value expires
+		"""
+		...
+
+	@abstractmethod
+	async def get(self, key: str) -> Optional[Any]:
+		""" Returns a value from the cache.
+
+			Args:
+				key: The key of the value
+
+			Returns:
+				value: The value, if found and not expired
+		"""
+		...
+
+	@abstractmethod
+	async def pop(self, key: str) -> Optional[Any]:
+		""" Returns a value from the cache and deletes it, atomically.
+			Only one of many concurrent callers can get the value.
+
+			Args:
+				key: The key of the value
+
+			Returns:
+				value: The value, if found and not expired
+		"""
+		...
+
+	@abstractmethod
+	async def delete(self, key: str) -> int:
+		""" Deletes a value from the cache.
+
+			Args:
+				key: The key of the value
+
+			Returns:
+				deleted_count: Number of deleted items
+		"""
+		...
+
+
+class MemoryCacheClient(CacheClient):
+	""" In-process cache. Only suitable for running a single process. """
+	def __init__(self):
+		self._values = {}
+
+	@staticmethod
+	def meets_condition(cache_type):
+		return cache_type == config.MEMORY_CACHE
+
+	async def close_connection(self):
+		self._values.clear()
+
+	async def set(self, key: str, value: Any, ttl: int):
+		self._values[key] = (time.monotonic() + ttl, value)
+
+	async def get(self, key: str) -> Optional[Any]:
+		entry = self._values.get(key)
+
+		if entry is None:
+			return None
+
+		if entry[0] < time.monotonic():
+			del self._values[key]
+			return None
+
+		return entry[1]
+
+	async def pop(self, key: str) -> Optional[Any]:
+		value = await self.get(key)
+		self._values.pop(key, None)
+
+		return value
+
+	async def delete(self, key: str) -> int:
+		return 1 if self._values.pop(key, None) is not None else 0
+
+
+class RedisCacheClient(CacheClient):
+	""" Wrapper around an asyncio Redis client. Shared by every
+		process and replica of the service.
+	"""
+	def __init__(self):
+		self._redis_client = aioredis.from_url(
+			config.REDIS_URL,
+			max_connections=config.REDIS_MAX_CONNECTIONS,
+		)
+
+	@staticmethod
+	def meets_condition(cache_type):
+		return cache_type == config.REDIS_CACHE
+
+	async def close_connection(self):
+		logger.info("Closing Redis connection")
+		await self._redis_client.close()
+
+	async def set(self, key: str, value: Any, ttl: int):
+		await self._redis_client.set(key, json.dumps(value), ex=ttl)
+
+	async def get(self, key: str) -> Optional[Any]:
+		value = await self._redis_client.get(key)
+
+		return json.loads(value) if value is not None else None
+
+	async def pop(self, key: str) -> Optional[Any]:
+		# GET and DEL in a single MULTI/EXEC transaction
+		async with self._redis_client.pipeline(transaction=True) as pipeline:
+			value, _ = await pipeline.get(key).delete(key).execute()
+
+		return json.loads(value) if value is not None else None
+
+	async def delete(self, key: str) -> int:
+		return await self._redis_client.delete(key)
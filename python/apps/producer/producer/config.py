@@ -7,6 +7,10 @@ LOCAL_DEPLOYMENT = True if os.getenv("LOCAL_DEPLOYMENT", "false") == "true" else
 # Supported database types by name
 MONGO_DB = "mongodb"
 
+# Supported cache types by name
+MEMORY_CACHE = "memory"
+REDIS_CACHE = "redis"
+
 # Supported authentication providers by name
 GOOGLE = "google-oidc"
 AZURE = "azure-oidc"
@@ -22,6 +26,45 @@ MONGODB_PASSWORD = os.getenv("DATABASE_PASSWORD")
 MONGODB_DATABASE = os.getenv("DATABASE_NAME")
 MONGODB_REPLICASET = "rs0"
 MONGODB_REFERENCE_MANAGER_COLLECTION = "referencemanager"
+# Group multi-document updates (i.e ratings) in transactions
+MONGODB_USE_TRANSACTIONS = True if os.getenv("MONGODB_USE_TRANSACTIONS", "false") == "true" else False
+
+# Build models out of documents read from the database without validating
+# them again. Documents are only ever written out of validated models
+TRUSTED_READS = True if os.getenv("TRUSTED_READS", "true") == "true" else False
+
+# Retries of a rating, when the user's rating changes concurrently
+RATING_MAX_ATTEMPTS = 5
+
+# Number of references per page, when listing the references of a user
+REFERENCES_PAGE_SIZE = int(os.getenv("REFERENCES_PAGE_SIZE", 50))
+MAX_REFERENCES_PAGE_SIZE = int(os.getenv("MAX_REFERENCES_PAGE_SIZE", 200))
+
+# Bulk imports of references. Uploads larger than IMPORT_SPOOL_MAX_BYTES
+# are spooled to disk, and references are inserted IMPORT_BATCH_SIZE at a time.
+# Uploads larger than IMPORT_MAX_BYTES are rejected
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_SPOOL_MAX_BYTES = int(os.getenv("IMPORT_SPOOL_MAX_BYTES", 1024 * 1024))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 50 * 1024 * 1024))
+
+# Maximum number of references that can be bookmarked in one call
+MAX_BULK_BOOKMARKS = int(os.getenv("MAX_BULK_BOOKMARKS", 500))
+
+# Workers for hashing external subject ids. bcrypt is deliberately slow,
+# so it runs on a pool of processes (or threads) instead of the event loop
+HASHING_POOL_SIZE = int(os.getenv("HASHING_POOL_SIZE", 2))
+HASHING_USE_PROCESSES = True if os.getenv("HASHING_USE_PROCESSES", "true") == "true" else False
+
+# Selected cache type to use. Anything but "memory" allows
+# running more than one process or replica of the service
+CACHE_TYPE = os.getenv("CACHE_TYPE", MEMORY_CACHE)
+
+# Seconds to cache users for, between authenticated requests. 0 disables it
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+
+# Redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
 
 # Google login
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", None)
@@ -37,6 +80,12 @@ AZURE_AUTHORITY = f"https://login.microsoftonline.com/common"
 AZURE_DISCOVERY_URL = os.environ.get("AZURE_DISCOVERY_URL", None)
 AZURE_REDIRECT_URL = os.environ.get("AZURE_REDIRECT_URL", None)
 
+# Outgoing HTTP requests to the authentication providers
+AUTH_HTTP_TIMEOUT_SECONDS = int(os.environ.get("AUTH_HTTP_TIMEOUT_SECONDS", 10))
+AUTH_HTTP_MAX_CONNECTIONS = int(os.environ.get("AUTH_HTTP_MAX_CONNECTIONS", 20))
+# Used when a discovery document is served without HTTP cache headers
+DISCOVERY_DOCUMENT_TTL_SECONDS = int(os.environ.get("DISCOVERY_DOCUMENT_TTL_SECONDS", 3600))
+
 # Front end endpoint
 FRONTEND_URL = os.environ.get("FRONTEND_URL", None)
 
@@ -45,6 +94,7 @@ JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", None)
 ALGORITHM = os.environ.get("ALGORITHM", None)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
 AUTH_TOKEN_EXPIRE_MINUTES = int(os.environ.get("AUTH_TOKEN_EXPIRE_MINUTES", 1))
+STATE_TOKEN_EXPIRE_MINUTES = int(os.environ.get("STATE_TOKEN_EXPIRE_MINUTES", 10))
 ACCESS_COOKIE_EXPIRE_SECONDS = int(os.environ.get("ACCESS_COOKIE_EXPIRE_SECONDS", 900))
 
 # Sentry configuration
@@ -1,21 +1,31 @@
 from abc import ABC, abstractmethod
+import asyncio
+import base64
+import binascii
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import datetime
 import hashlib
-from typing import List
+import json
+from typing import List, Optional, Tuple
 from uuid import uuid4
 
 from motor.motor_asyncio import (
 	AsyncIOMotorClient,
 	AsyncIOMotorClientSession,
 )
+from pymongo import ASCENDING, ReturnDocument
 from passlib.hash import bcrypt
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, ServerSelectionTimeoutError, WriteError
 
 from contextlog import contextlog
+from mongoindexes import UNIQUE_TITLES_VERSION, ensure_indexes, get_projection, get_version, hydrate
 from producer import config
+from producer.cache_clients import CacheClient
 from producer.exceptions import (
 	DatabaseConnectionError,
 	DocumentDoesNotExist,
+	DocumentExists,
+	InvalidCursor,
 	UnknownDatabaseType,
 )
 from producer.models.db_models import (
@@ -24,6 +34,7 @@ from producer.models.db_models import (
 	RatingOptions,
 	Reference,
 	ReferenceMetadata,
+	ReferencePage,
 	UserRating,
 )
 from producer.models.auth_models import (
@@ -34,17 +45,109 @@ from producer.models.auth_models import (
 
 logger = contextlog.get_contextlog()
 
-def get_db_client(db_type):
+# Pool of workers for the CPU bound hashing of external subject ids
+if config.HASHING_USE_PROCESSES:
+	hashing_executor = ProcessPoolExecutor(max_workers=config.HASHING_POOL_SIZE)
+else:
+	hashing_executor = ThreadPoolExecutor(max_workers=config.HASHING_POOL_SIZE)
+
+
+def hash_external_sub_id(external_sub_id: str, email: str) -> str:
+	""" Hashes an external subject id with bcrypt, using a salt derived
+		from the email of the user.
+
+		Runs in the hashing_executor, hence a module level function.
+
+		Args:
+			external_sub_id: The subject id received from the external provider
+			email: The email of the user
+
+		Returns:
+			encrypted_external_sub_id: The encrypted external subject id
+	"""
+	salt = email.lower()
+	salt = salt.replace(" ", "")
+	# Hash the salt so that the email is not plain text visible in the database
+	salt = hashlib.sha256(salt.encode()).hexdigest()
+	# bcrypt requires a 22 char salt
+	if len(salt) > 21:
+		salt = salt[:21]
+
+	# As per passlib the last character of the salt should always be one of [.Oeu]
+	salt = salt + "O"
+
+	return bcrypt.using(salt=salt).hash(external_sub_id)
+
+
+# MongoDB error code of a write that violates a unique index
+DUPLICATE_KEY_ERROR = 11000
+
+# Server side projections of the models read from the database
+REFERENCE_PROJECTION = get_projection(Reference)
+INTERNAL_USER_PROJECTION = get_projection(InternalUser)
+
+# Along with the sort keys of the pages, which are removed before returning
+REFERENCE_PAGE_PROJECTION = dict(REFERENCE_PROJECTION, **{"_id": 1, "metadata.created_at": 1})
+REFERENCE_PAGE_SORT = [("metadata.created_at", ASCENDING), ("_id", ASCENDING)]
+
+
+def encode_cursor(reference_doc: dict) -> str:
+	""" Encodes the sort keys of a reference into an opaque cursor
+
+		Args:
+			reference_doc: A reference read with REFERENCE_PAGE_PROJECTION
+
+		Returns:
+			cursor: The cursor of the page after the reference
+	"""
+	data = json.dumps(
+		[reference_doc["metadata"]["created_at"].isoformat(), reference_doc["_id"]],
+		separators=(",", ":"),
+	)
+
+	return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+	""" Decodes a cursor back into the sort keys of a reference
+
+		Args:
+			cursor: A cursor returned by encode_cursor
+
+		Returns:
+			created_at: The creation time of the reference
+			reference_id: The _id of the reference
+
+		Raises:
+			producer.exceptions.InvalidCursor
+	"""
+	try:
+		created_at, reference_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+		created_at = datetime.datetime.fromisoformat(created_at)
+	except (binascii.Error, ValueError, TypeError):
+		raise InvalidCursor(cursor)
+
+	if not isinstance(reference_id, str):
+		raise InvalidCursor(cursor)
+
+	return created_at, reference_id
+
+
+def get_db_client(db_type, cache: CacheClient):
 	""" Works out the correct database client based on
 		the database type provided in the configuration
 
+		Args:
+			db_type: One of database types as defined in config
+			cache: Cache for the users that the client reads
+
 		Raises:
 			producer.exceptions.UnknownDatabaseType
 	"""
 	for client_cls in DatabaseClient.__subclasses__():
 		try:
 			if client_cls.meets_condition(db_type):
-				return client_cls()
+				return client_cls(cache)
 		except KeyError:
 			continue
 
@@ -88,6 +191,18 @@ class DatabaseClient(ABC):
 		""" Ends a session in the database. """
 		...
 
+	@abstractmethod
+	async def create_indexes(self):
+		""" Creates the indexes that the queries of the service rely on.
+
+			Called once at the start of the service. Safe to call
+			from more than one replica at the same time.
+
+			Raises:
+				producer.exception.DatabaseConnectionError
+		"""
+		...
+
 	@abstractmethod
 	async def find_by_id(self, reference_id: str) -> Reference:
 		""" Searches for reference documents by id.
@@ -113,50 +228,70 @@ class DatabaseClient(ABC):
 		...
 
 	@abstractmethod
-	async def find_by_title(self, title: str) -> List[Reference]:
-		""" Searches for reference documents by title.
+	async def find_by_author(
+		self, internal_sub_id: str, page_size: int, cursor: Optional[str] = None
+	) -> ReferencePage:
+		""" Searches for reference documents by author, one page at a time.
+
+			References are ordered by their creation time, then by their id.
 
 			Args:
-				title: The title of the reference
+				internal_sub_id: The unique id of the user as defined in this application
+				page_size: The maximum number of references to return
+				cursor: The next_cursor of the previous page, if any
 
 			Returns:
-				references: A list of references that match the title
+				reference_page: A page of references that match the author
 		"""
 		...
 
 	@abstractmethod
-	async def find_by_author(self, internal_sub_id: str) -> List[Reference]:
-		""" Searches for reference documents by author.
+	async def find_bookmarked_by_author(
+		self, internal_user: InternalUser, page_size: int, cursor: Optional[str] = None
+	) -> ReferencePage:
+		""" Searches for reference documents by bookmarked ids of the author,
+			one page at a time.
+
+			References are ordered by their creation time, then by their id.
 
 			Args:
-				internal_sub_id: The unique id of the user as defined in this application
+				internal_user: A user objects as defined in this application
+				page_size: The maximum number of references to return
+				cursor: The next_cursor of the previous page, if any
 
 			Returns:
-				references: A list of references that match the author
+				reference_page: A page of references bookmarked by the author
 		"""
 		...
 
 	@abstractmethod
-	async def find_bookmarked_by_author(self, internal_sub_id: str) -> List[Reference]:
-		""" Searches for reference documents by bookmarked ids of the author.
+	async def insert_reference(self, document: Reference, metadata: ReferenceMetadata) -> Reference:
+		""" Inserts a reference in the database.
 
 			Args:
-				internal_sub_id: The unique id of the user as defined in this application
+				document: A reference to insert in the database
 
 			Returns:
-				references: A list of references that match the author
+				reference_id: The id of the inserted item
+
+			Raises:
+				producer.exceptions.DocumentExists
 		"""
 		...
 
 	@abstractmethod
-	async def insert_reference(self, document: Reference, metadata: ReferenceMetadata) -> Reference:
-		""" Inserts a reference in the database.
+	async def insert_references(self, documents: List[Reference], metadata: ReferenceMetadata) -> List[Optional[str]]:
+		""" Inserts many references in the database, in one call.
+
+			References with the title of an existing reference, or of
+			an earlier reference in the list, are skipped.
 
 			Args:
-				document: A reference to insert in the database
+				documents: The references to insert in the database
+				metadata: The metadata of all the references
 
 			Returns:
-				reference_id: The id of the inserted item
+				reference_ids: The id of each inserted reference, or None if skipped
 		"""
 		...
 
@@ -169,6 +304,10 @@ class DatabaseClient(ABC):
 
 			Returns:
 				reference_id: The id of the updated reference
+
+			Raises:
+				producer.exceptions.DocumentDoesNotExist
+				producer.exceptions.DocumentExists
 		"""
 		...
 
@@ -198,6 +337,19 @@ class DatabaseClient(ABC):
 		"""
 		...
 
+	@abstractmethod
+	async def add_bookmarks(self, reference_ids: List[str], internal_user: InternalUser) -> int:
+		""" Creates new bookmarks in the user's account, for a list of references
+
+			Args:
+				reference_ids: The reference_ids to add to the bookmarks
+				internal_user: A user objects as defined in this application
+
+			Returns:
+				modified_count: Number of modified users
+		"""
+		...
+
 	@abstractmethod
 	async def remove_bookmark(self, reference_id: int, internal_user: InternalUser):
 		""" Given a reference_id, it deletes the bookmark from the user's account
@@ -285,6 +437,9 @@ class DatabaseClient(ABC):
 			used to uniquely identify a user in the system of the external provider and
 			are usually public. However, it is better to be stored encrypted just in case.
 
+			The hash is kept on the external user, so that looking the user up and
+			then creating them only pays for bcrypt once.
+
 			Args:
 				external_user: An object representing a user with information
 								based on the external provider's service.
@@ -292,24 +447,66 @@ class DatabaseClient(ABC):
 			Returns:
 				encrypted_external_sub_id: The encrypted external subject id
 		"""
-		salt = external_user.email.lower()
-		salt = salt.replace(" ", "")
-		# Hash the salt so that the email is not plain text visible in the database
-		salt = hashlib.sha256(salt.encode()).hexdigest()
-		# bcrypt requires a 22 char salt
-		if len(salt) > 21:
-			salt = salt[:21]
+		if external_user.encrypted_external_sub_id is None:
+			loop = asyncio.get_event_loop()
+			external_user.encrypted_external_sub_id = await loop.run_in_executor(
+				hashing_executor,
+				hash_external_sub_id,
+				external_user.external_sub_id,
+				external_user.email,
+			)
+
+		return external_user.encrypted_external_sub_id
+
+	async def _get_cached_user(self, internal_sub_id: str) -> InternalUser:
+		""" Returns a user from the user cache.
+
+			Args:
+				internal_sub_id: The unique id of the user as defined in this application
+
+			Returns:
+				internal_user: A user objects as defined in this application, if cached
+		"""
+		if not config.USER_CACHE_TTL_SECONDS:
+			return None
+
+		cached_user = await self._cache.get(f"user:{internal_sub_id}")
+
+		if cached_user is None:
+			return None
+
+		return InternalUser.parse_raw(cached_user)
+
+	async def _cache_user(self, internal_user: InternalUser):
+		""" Adds a user to the user cache for a short time. Users are
+			cached as json strings, so that every read gets its own copy.
+
+			Args:
+				internal_user: A user objects as defined in this application
+		"""
+		if not config.USER_CACHE_TTL_SECONDS:
+			return
 
-		# As per passlib the last character of the salt should always be one of [.Oeu]
-		salt = salt + "O"
+		await self._cache.set(
+			f"user:{internal_user.internal_sub_id}",
+			internal_user.json(),
+			ttl=config.USER_CACHE_TTL_SECONDS,
+		)
 
-		encrypted_external_sub_id = bcrypt.using(salt=salt).hash(external_user.external_sub_id)
-		return encrypted_external_sub_id
+	async def _invalidate_cached_user(self, internal_sub_id: str):
+		""" Evicts a user from the user cache. Called whenever a user changes.
+
+			Args:
+				internal_sub_id: The unique id of the user as defined in this application
+		"""
+		await self._cache.delete(f"user:{internal_sub_id}")
 
 
 class MongoDBClient(DatabaseClient):
 	""" Wrapper around an AsyncIOMotorClient object. """
-	def __init__(self):
+	def __init__(self, cache: CacheClient):
+		self._cache = cache
+
 		# Connection arguments
 		mongo_args = dict(
 			host=config.MONGODB_HOST,
@@ -342,6 +539,8 @@ class MongoDBClient(DatabaseClient):
 		self._reference_manager_coll = self._db[config.MONGODB_REFERENCE_MANAGER_COLLECTION]
 		self._users_coll = self._db["users"]
 		self._session = None
+		# Whether the unique title index exists, once the indexes are created
+		self._unique_titles = False
 
 	@staticmethod
 	def meets_condition(db_type):
@@ -362,14 +561,31 @@ class MongoDBClient(DatabaseClient):
 		logger.info("Ending MongoDB session")
 		await self._session.end_session()
 
+	async def create_indexes(self):
+		logger.info("Creating MongoDB indexes")
+		try:
+			version = await ensure_indexes(self._db)
+		except ServerSelectionTimeoutError as exc:
+			raise DatabaseConnectionError(exc)
+		except OperationFailure as exc:
+			# Served with the indexes of the previous version until resolved
+			logger.error(f"Failed to create MongoDB indexes: {exc}")
+			version = await get_version(self._db)
+
+		logger.info(f"MongoDB indexes at version {version}")
+
+		self._unique_titles = version >= UNIQUE_TITLES_VERSION
+		if not self._unique_titles:
+			logger.warning("Titles are not unique in the database, they are checked before every write")
+
 	async def find_by_id(self, reference_id: str) -> Reference:
 		reference = None
-		reference_doc = await self._reference_manager_coll.find_one({'_id': reference_id})
+		reference_doc = await self._reference_manager_coll.find_one(
+			{'_id': reference_id}, REFERENCE_PROJECTION
+		)
 
 		if reference_doc:
-			del reference_doc["metadata"]
-			del reference_doc["_id"]
-			reference = Reference(**reference_doc)
+			reference = hydrate(Reference, reference_doc, config.TRUSTED_READS)
 
 		return reference
 
@@ -377,200 +593,408 @@ class MongoDBClient(DatabaseClient):
 		result = await self._reference_manager_coll.delete_one({'_id': reference_id})
 		return result.deleted_count
 
-	async def find_by_title(self, title: str) -> List[Reference]:
-		references = []
+	async def find_by_author(
+		self, internal_sub_id: str, page_size: int, cursor: Optional[str] = None
+	) -> ReferencePage:
+		return await self._find_page({"metadata.author_id": internal_sub_id}, page_size, cursor)
 
-		async for document in self._reference_manager_coll.find({"title": title}):
-			# Clear DB specific data
-			del document["metadata"]
-			del document["_id"]
-			references.append(Reference(**document))
+	async def find_bookmarked_by_author(
+		self, internal_user: InternalUser, page_size: int, cursor: Optional[str] = None
+	) -> ReferencePage:
+		return await self._find_page(
+			{"_id": {"$in": internal_user.bookmarked_references}}, page_size, cursor
+		)
 
-		return references
+	async def _find_page(self, query: dict, page_size: int, cursor: Optional[str]) -> ReferencePage:
+		""" Fetches a page of the references that match a query.
 
-	async def find_by_author(self, internal_sub_id: str) -> List[Reference]:
-		references = []
+			Pages are keyed on the creation time and the _id of the last
+			reference of the previous page, so that they are served from an
+			index no matter how deep the client pages, unlike with skip().
+			One extra document is fetched to tell whether there is a next page.
 
-		async for document in self._reference_manager_coll.find({"metadata.author_id": internal_sub_id}):
-			# Clear DB specific data
-			del document["metadata"]
-			del document["_id"]
-			references.append(Reference(**document))
+			The documents are returned as they are read, for the endpoints
+			to serialize them directly, without building models first.
 
-		return references
+			Args:
+				query: The filter of the references
+				page_size: The maximum number of references to return
+				cursor: The next_cursor of the previous page, if any
 
-	async def find_bookmarked_by_author(self, internal_user: InternalUser) -> List[Reference]:
-		references = []
+			Returns:
+				reference_page: A page of references that match the query
 
-		async for document in self._reference_manager_coll.find({
-			"reference_id": {"$in": internal_user.bookmarked_references}
-		}):
-			# Clear DB specific data
-			del document["metadata"]
-			del document["_id"]
-			references.append(Reference(**document))
+			Raises:
+				producer.exceptions.InvalidCursor
+		"""
+		if cursor is not None:
+			created_at, reference_id = decode_cursor(cursor)
+			query = {"$and": [query, {"$or": [
+				{"metadata.created_at": {"$gt": created_at}},
+				{"metadata.created_at": created_at, "_id": {"$gt": reference_id}},
+			]}]}
 
-		return references
+		references = await self._reference_manager_coll.find(query, REFERENCE_PAGE_PROJECTION).sort(
+			REFERENCE_PAGE_SORT
+		).to_list(page_size + 1)
+
+		next_cursor = None
+		if len(references) > page_size:
+			references = references[:page_size]
+			next_cursor = encode_cursor(references[-1])
+
+		for reference in references:
+			del reference["_id"]
+			del reference["metadata"]
+
+		return ReferencePage(references=references, next_cursor=next_cursor)
 
 	async def insert_reference(self, document: Reference, metadata: ReferenceMetadata) -> Reference:
-		inserted_reference = None
+		await self._check_title_is_free(document.title)
+
+		document = self._build_reference_document(document, metadata)
+
+		logger.info(f"Inserting {document}")
+		try:
+			await self._reference_manager_coll.insert_one(document)
+		except DuplicateKeyError:
+			# Titles are unique, as per the indexes of the collection
+			raise DocumentExists(document["title"])
+
+		# The inserted document is exactly the one built above
+		del document["metadata"]
+		del document["_id"]
+		inserted_reference = hydrate(Reference, document, config.TRUSTED_READS)
+
+		return inserted_reference
+
+	async def insert_references(self, documents: List[Reference], metadata: ReferenceMetadata) -> List[Optional[str]]:
+		reference_ids = [None] * len(documents)
+
+		if not documents:
+			return reference_ids
+
+		# Titles are unique, as per the indexes of the collection
+		existing_titles = set()
+		async for document in self._reference_manager_coll.find(
+			{"title": {"$in": [document.title for document in documents]}}, {"title": 1}
+		):
+			existing_titles.add(document["title"])
+
+		positions = []
+		new_documents = []
+		for i, document in enumerate(documents):
+			if document.title in existing_titles:
+				continue
+
+			existing_titles.add(document.title)
+			positions.append(i)
+			new_documents.append(self._build_reference_document(document, metadata))
+
+		if not new_documents:
+			return reference_ids
+
+		logger.info(f"Inserting {len(new_documents)} references")
+
+		failed_positions = set()
+		try:
+			await self._reference_manager_coll.insert_many(new_documents, ordered=False)
+		except BulkWriteError as exc:
+			for error in exc.details["writeErrors"]:
+				# Titles inserted concurrently, since they were looked up
+				if error["code"] != DUPLICATE_KEY_ERROR:
+					raise
+				failed_positions.add(error["index"])
+
+		for j, (i, document) in enumerate(zip(positions, new_documents)):
+			if j not in failed_positions:
+				reference_ids[i] = document["reference_id"]
 
+		return reference_ids
+
+	async def _check_title_is_free(self, title: str, reference_id: Optional[str] = None):
+		""" Checks that no other reference has a title, unless the unique
+			title index already rejects such writes.
+
+			Args:
+				title: The title of the reference that is written
+				reference_id: The id of the reference, when it is updated
+
+			Raises:
+				producer.exceptions.DocumentExists
+		"""
+		if self._unique_titles:
+			return
+
+		existing_reference = await self._reference_manager_coll.find_one(
+			{"title": title, "_id": {"$ne": reference_id}}, {"_id": 1}
+		)
+
+		if existing_reference is not None:
+			raise DocumentExists(title)
+
+	def _build_reference_document(self, document: Reference, metadata: ReferenceMetadata) -> dict:
+		""" Builds the document of a new reference
+
+			Args:
+				document: A reference to insert in the database
+				metadata: The metadata of the reference
+
+			Returns:
+				document: The document to insert
+		"""
 		document = document.dict()
 		document["_id"] = str(uuid4())
 		document["reference_id"] = document["_id"]
 		document["metadata"] = metadata.dict()
 		document["rating"] = dict(positive=0, negative=0)
 
-		logger.info(f"Inserting {document}")
-		result = await self._reference_manager_coll.insert_one(document)
-
-		if result:
-			inserted_reference = await self.find_by_id(result.inserted_id)
-
-		return inserted_reference
+		return document
 
 	async def update_reference(self, document: Reference) -> Reference:
-		updated_reference = None
-
 		logger.info(f"Updating {document}")
 
-		existing_reference = await self.find_by_id(document.reference_id)
+		# Only the affiliate links of the existing reference are needed
+		existing_reference = await self._reference_manager_coll.find_one(
+			{'_id': document.reference_id}, {"books.name": 1, "books.book_links": 1}
+		)
 
 		if existing_reference is None:
 			raise DocumentDoesNotExist(document.title)
 
+		await self._check_title_is_free(document.title, document.reference_id)
+
 		# Updating affiliate links should never be available via the API
-		for existing_book in existing_reference.books:
+		for existing_book in existing_reference.get("books", []):
 			for book in document.books:
-				if existing_book.name == book.name:
-					book.book_links = existing_book.book_links
+				if existing_book.get("name") == book.name:
+					book.book_links = existing_book.get("book_links")
 					break
 
-		# Updating reference rating should never be available via the API
-		document.rating = existing_reference.rating
+		# Updating reference rating should never be available via the API,
+		# so it is left out of the update altogether
+		try:
+			updated_document = await self._reference_manager_coll.find_one_and_update(
+				{'_id': document.reference_id},
+				{'$set': document.dict(exclude={"rating"})},
+				projection=REFERENCE_PROJECTION,
+				return_document=ReturnDocument.AFTER,
+			)
+		except DuplicateKeyError:
+			raise DocumentExists(document.title)
 
-		result = await self._reference_manager_coll.update_one(
-			{'_id': document.reference_id}, {'$set': document.dict()}
-		)
+		if updated_document is None:
+			raise DocumentDoesNotExist(document.title)
 
-		if result.modified_count:
-			updated_reference = await self.find_by_id(document.reference_id)
+		updated_reference = hydrate(Reference, updated_document, config.TRUSTED_READS)
 
 		return updated_reference
 
 	async def rate_reference(self, reference_id: int, rate_option: str, internal_user: InternalUser) -> bool:
-		reference_doc = await self._reference_manager_coll.find_one({'_id': reference_id})
+		try:
+			rated = await self._run_rating(reference_id, rate_option, internal_user)
+		except WriteError:
+			# Users used to be created with a list of rated references. Converted
+			# outside of any transaction, as a failed write aborts the transaction
+			await self._users_coll.update_one(
+				{"internal_sub_id": internal_user.internal_sub_id, "rated_references": []},
+				{"$set": {"rated_references": {}}},
+			)
+			rated = await self._run_rating(reference_id, rate_option, internal_user)
 
-		if not reference_doc:
-			return
+		await self._invalidate_cached_user(internal_user.internal_sub_id)
 
-		if reference_id in internal_user.rated_references:
-			existing_rating_option = internal_user.rated_references[reference_id]
-			if rate_option == existing_rating_option:
-				del internal_user.rated_references[reference_id]
+		return rated
 
-				if rate_option == RatingOptions.thumbs_up:
-					reference_doc["rating"]["positive"] = reference_doc["rating"]["positive"] - 1
-				elif rate_option == RatingOptions.thumbs_down:
-					reference_doc["rating"]["negative"] = reference_doc["rating"]["negative"] - 1
+	async def _run_rating(self, reference_id: str, rate_option: str, internal_user: InternalUser) -> bool:
+		""" Runs a rating, in a transaction if MONGODB_USE_TRANSACTIONS is set.
 
-			else:
-				if rate_option == RatingOptions.thumbs_up and existing_rating_option == RatingOptions.thumbs_down:
-					reference_doc["rating"]["positive"] = reference_doc["rating"]["positive"] + 1
-					reference_doc["rating"]["negative"] = reference_doc["rating"]["negative"] - 1
+			Transactions that fail with a transient error (i.e a write conflict)
+			are retried by with_transaction, from the start.
 
-				elif rate_option == RatingOptions.thumbs_down and existing_rating_option == RatingOptions.thumbs_up:
-					reference_doc["rating"]["positive"] = reference_doc["rating"]["positive"] - 1
-					reference_doc["rating"]["negative"] = reference_doc["rating"]["negative"] + 1
+			Args:
+				reference_id: The reference_id to rate
+				rate_option: One of thumbs_up/thumbs_down/not_rated
+				internal_user: A user objects as defined in this application
 
-				internal_user.rated_references[reference_id] = rate_option
-		else:
-			internal_user.rated_references[reference_id] = rate_option
+			Returns:
+				success: True if the updates were successful
+		"""
+		if not config.MONGODB_USE_TRANSACTIONS:
+			return await self._rate_reference(reference_id, rate_option, internal_user)
+
+		# A session can only run one transaction at a time, so
+		# concurrent ratings cannot share the service's session
+		async with await self._motor_client.start_session() as session:
+			return await session.with_transaction(
+				lambda session: self._rate_reference(reference_id, rate_option, internal_user, session)
+			)
 
-			if rate_option == RatingOptions.thumbs_up:
-				reference_doc["rating"]["positive"] = reference_doc["rating"]["positive"] + 1
-			elif rate_option == RatingOptions.thumbs_down:
-				reference_doc["rating"]["negative"] = reference_doc["rating"]["negative"] + 1
+	async def _rate_reference(
+		self,
+		reference_id: str,
+		rate_option: str,
+		internal_user: InternalUser,
+		session: AsyncIOMotorClientSession = None,
+	) -> bool:
+		""" Changes the rating of a user with a compare-and-set on the user's
+			document, and then moves the counters of the reference with $inc.
 
-		reference_update_result = await self._reference_manager_coll.update_one(
-			{"reference_id": reference_id},
-			{"$set": {"rating": reference_doc["rating"]}}
-		)
+			The compare-and-set guarantees that concurrent ratings of the same
+			user are applied one after the other, so that every change of the
+			user's rating is reflected exactly once in the counters.
 
-		user_update_result = await self._users_coll.update_one(
-			{"internal_sub_id": internal_user.internal_sub_id},
-			{"$set": {"rated_references": internal_user.rated_references}}
-		)
+			Args:
+				reference_id: The reference_id to rate
+				rate_option: One of thumbs_up/thumbs_down/not_rated
+				internal_user: A user objects as defined in this application
+				session: The session of the transaction, if any
 
-		if reference_update_result.modified_count and user_update_result.modified_count:
-			return True
+			Returns:
+				success: True if the updates were successful
 
-		return False
+			Raises:
+				pymongo.errors.WriteError: If the user still has a legacy list of rated references
+		"""
+		rating_key = f"rated_references.{reference_id}"
+		user_filter = {"internal_sub_id": internal_user.internal_sub_id}
 
+		previous_option = (internal_user.rated_references or {}).get(reference_id)
 
+		for _ in range(config.RATING_MAX_ATTEMPTS):
+			if previous_option is not None:
+				previous_option = RatingOptions(previous_option).value
 
-	async def add_bookmark(self, reference_id: int, internal_user: InternalUser):
-		if reference_id not in internal_user.bookmarked_references:
+			# Rating a reference the same way twice withdraws the rating
+			rated_option = None if previous_option == rate_option else rate_option
 
-			internal_user.bookmarked_references.append(reference_id)
+			if rated_option is None:
+				update = {"$unset": {rating_key: ""}}
+			else:
+				update = {"$set": {rating_key: rated_option}}
 
 			result = await self._users_coll.update_one(
-				{"internal_sub_id": internal_user.internal_sub_id},
-				{"$set": {"bookmarked_references": internal_user.bookmarked_references}}
+				{**user_filter, rating_key: previous_option or {"$exists": False}},
+				update,
+				session=session,
 			)
 
-			return result.modified_count
+			if result.modified_count:
+				break
 
-	async def remove_bookmark(self, reference_id: int, internal_user: InternalUser):
-		if reference_id in internal_user.bookmarked_references:
+			# The rating changed since the user was read. Retry from the stored one
+			mongo_user = await self._users_coll.find_one(
+				user_filter, {"rated_references": 1}, session=session
+			)
 
-			internal_user.bookmarked_references.remove(reference_id)
+			if not mongo_user:
+				return False
 
-			result = await self._users_coll.update_one(
-				{"internal_sub_id": internal_user.internal_sub_id},
-				{"$set": {"bookmarked_references": internal_user.bookmarked_references}}
+			rated_references = mongo_user.get("rated_references") or {}
+			previous_option = rated_references.get(reference_id)
+		else:
+			logger.warning(f"Gave up rating reference {reference_id} after concurrent updates")
+			return False
+
+		counters = {
+			RatingOptions.thumbs_up.value: "rating.positive",
+			RatingOptions.thumbs_down.value: "rating.negative",
+		}
+
+		increments = {}
+		if previous_option in counters:
+			increments[counters[previous_option]] = -1
+		if rated_option in counters:
+			increments[counters[rated_option]] = 1
+
+		if increments:
+			result = await self._reference_manager_coll.update_one(
+				{"_id": reference_id}, {"$inc": increments}, session=session
 			)
+			reference_exists = result.matched_count
+		else:
+			reference_exists = await self._reference_manager_coll.count_documents(
+				{"_id": reference_id}, limit=1, session=session
+			)
+
+		if not reference_exists:
+			# Put the user's rating back the way it was
+			if previous_option is None:
+				revert = {"$unset": {rating_key: ""}}
+			else:
+				revert = {"$set": {rating_key: previous_option}}
+
+			await self._users_coll.update_one(user_filter, revert, session=session)
+			return False
+
+		if internal_user.rated_references is None:
+			internal_user.rated_references = {}
+
+		if rated_option is None:
+			internal_user.rated_references.pop(reference_id, None)
+		else:
+			internal_user.rated_references[reference_id] = rated_option
+
+		return True
 
-			return result.modified_count
+	async def add_bookmark(self, reference_id: int, internal_user: InternalUser):
+		return await self.add_bookmarks([reference_id], internal_user)
+
+	async def add_bookmarks(self, reference_ids: List[str], internal_user: InternalUser) -> int:
+		result = await self._users_coll.update_one(
+			{"internal_sub_id": internal_user.internal_sub_id},
+			{"$addToSet": {"bookmarked_references": {"$each": reference_ids}}}
+		)
+
+		await self._invalidate_cached_user(internal_user.internal_sub_id)
+
+		for reference_id in reference_ids:
+			if reference_id not in internal_user.bookmarked_references:
+				internal_user.bookmarked_references.append(reference_id)
 
+		return result.modified_count
+
+	async def remove_bookmark(self, reference_id: int, internal_user: InternalUser):
+		result = await self._users_coll.update_one(
+			{"internal_sub_id": internal_user.internal_sub_id},
+			{"$pull": {"bookmarked_references": reference_id}}
+		)
+
+		await self._invalidate_cached_user(internal_user.internal_sub_id)
+
+		if reference_id in internal_user.bookmarked_references:
+			internal_user.bookmarked_references.remove(reference_id)
+
+		return result.modified_count
 
 	async def get_user_by_external_sub_id(self, external_user: ExternalUser) -> InternalUser:
 		internal_user = None
 
 		encrypted_external_sub_id = await self._encrypt_external_sub_id(external_user)
 
-		mongo_user = await self._users_coll.find_one({'external_sub_id': encrypted_external_sub_id})
+		mongo_user = await self._users_coll.find_one(
+			{'external_sub_id': encrypted_external_sub_id}, INTERNAL_USER_PROJECTION
+		)
 
 		if mongo_user:
-			internal_user = InternalUser(
-				internal_sub_id=mongo_user["internal_sub_id"],
-				external_sub_id=mongo_user["external_sub_id"],
-				username=mongo_user["username"],
-				is_author=mongo_user["is_author"],
-				requested_join=mongo_user["requested_join"],
-				bookmarked_references=mongo_user["bookmarked_references"],
-				rated_references=mongo_user["rated_references"],
-				created_at=mongo_user["created_at"],
-			)
+			internal_user = hydrate(InternalUser, mongo_user, config.TRUSTED_READS)
 
 		return internal_user
 
 	async def get_user_by_internal_sub_id(self, internal_sub_id: str) -> InternalUser:
-		internal_user = None
+		internal_user = await self._get_cached_user(internal_sub_id)
 
-		mongo_user = await self._users_coll.find_one({'_id': internal_sub_id})
+		if internal_user:
+			return internal_user
+
+		mongo_user = await self._users_coll.find_one(
+			{'_id': internal_sub_id}, INTERNAL_USER_PROJECTION
+		)
 
 		if mongo_user:
-			internal_user = InternalUser(
-				internal_sub_id=mongo_user["internal_sub_id"],
-				external_sub_id=mongo_user["external_sub_id"],
-				username=mongo_user["username"],
-				is_author=mongo_user["is_author"],
-				requested_join=mongo_user["requested_join"],
-				bookmarked_references=mongo_user["bookmarked_references"],
-				rated_references=mongo_user["rated_references"],
-				created_at=mongo_user["created_at"],
-			)
+			internal_user = hydrate(InternalUser, mongo_user, config.TRUSTED_READS)
+
+			await self._cache_user(internal_user)
 
 		return internal_user
 
@@ -587,31 +1011,26 @@ class MongoDBClient(DatabaseClient):
 				is_author=False,
 				requested_join=False,
 				bookmarked_references=[],
-				rated_references=[],
+				rated_references={},
 				created_at=datetime.datetime.utcnow(),
 			)
 		)
 
 		mongo_user_id = result.inserted_id
 
-		mongo_user = await self._users_coll.find_one({'_id': mongo_user_id})
-
-		internal_user = InternalUser(
-			internal_sub_id=mongo_user["internal_sub_id"],
-			external_sub_id=mongo_user["external_sub_id"],
-			username=mongo_user["username"],
-			is_author=mongo_user["is_author"],
-			requested_join=mongo_user["requested_join"],
-			bookmarked_references=mongo_user["bookmarked_references"],
-			rated_references=mongo_user["rated_references"],
-			created_at=mongo_user["created_at"],
+		mongo_user = await self._users_coll.find_one(
+			{'_id': mongo_user_id}, INTERNAL_USER_PROJECTION
 		)
 
+		internal_user = hydrate(InternalUser, mongo_user, config.TRUSTED_READS)
+
 		return internal_user
 
 	async def delete_internal_user(self, internal_user: InternalUser) -> int:
 		result = await self._users_coll.delete_one({'_id': internal_user.internal_sub_id})
 
+		await self._invalidate_cached_user(internal_user.internal_sub_id)
+
 		if result.deleted_count:
 			await self._reference_manager_coll.update_many(
 				{"metadata.author_id": internal_user.internal_sub_id},
@@ -628,6 +1047,8 @@ class MongoDBClient(DatabaseClient):
 			{"$set": internal_user.dict()}
 		)
 
+		await self._invalidate_cached_user(internal_user.internal_sub_id)
+
 		if result.modified_count:
 			updated_user = internal_user
 
@@ -30,6 +30,26 @@ class DocumentDoesNotExist(DatabaseException):
 		self.title = title
 
 
+class InvalidCursor(DatabaseException):
+	def __init__(self, cursor):
+		super(InvalidCursor, self).__init__()
+		self.cursor = cursor
+
+
+class UploadTooLarge(Exception):
+	def __init__(self, max_bytes):
+		super(UploadTooLarge, self).__init__()
+		self.max_bytes = max_bytes
+
+
+class CacheException(Exception):
+	pass
+
+
+class UnknownCacheType(CacheException):
+	pass
+
+
 class AuthenticationException(Exception):
 	pass
 
@@ -67,9 +87,34 @@ async def exception_handling():
 	except DocumentDoesNotExist as exc:
 		logger.warning(f"Failed to update document: {repr(exc)}")
 		raise HTTPException(status_code=404, detail=f"Reference '{exc.title}' does not exist.")
+	except InvalidCursor as exc:
+		logger.warning(f"Failed to page references: {repr(exc)}")
+		raise HTTPException(status_code=400, detail="Invalid cursor.")
+	except UploadTooLarge as exc:
+		logger.warning(f"Failed to receive upload: {repr(exc)}")
+		raise HTTPException(status_code=413, detail=f"Uploads are limited to {exc.max_bytes} bytes.")
 	except UnauthorizedUser as exc:
 		logger.warning(f"Failed to authorize user: {repr(exc)}")
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not authorized")
 	except Exception as exc:
 		logger.exception(repr(exc))
 		raise HTTPException(status_code=500, detail="An error has occurred. Please try again.")
+
+
+def get_stream_error(exc: Exception) -> str:
+	""" Logs an error raised while a response was being streamed, when
+		its status has already been sent and exception_handling() no
+		longer applies.
+
+		Args:
+			exc: The error raised by the items of the stream
+
+		Returns:
+			message: The message of the final error record of the stream
+	"""
+	if isinstance(exc, DatabaseConnectionError):
+		logger.exception(f"Failed to connect to the database: {repr(exc)}")
+		return "Cannot serve results at the moment. Please try again."
+
+	logger.exception(repr(exc))
+	return "An error has occurred. Please try again."
@@ -0,0 +1,180 @@
+"""
+	Bulk import of references from ndjson uploads, one reference per line.
+
+	The upload is spooled to a temporary file while it is received, and
+	then read back line by line. References are written in batches and
+	a result is reported for every line, so that memory stays bounded
+	no matter the size of the upload. The file is written and read in
+	the default executor, as it is on disk once it outgrows memory.
+"""
+import asyncio
+from itertools import islice
+import json
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, List, Tuple, Union
+
+from pydantic import ValidationError
+
+from producer import config
+from producer.db_clients import DatabaseClient
+from producer.exceptions import UploadTooLarge
+from producer.models.db_models import Reference, ReferenceMetadata
+
+
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+
+async def spool_upload(chunks: AsyncIterator[bytes]) -> BinaryIO:
+	""" Writes an upload to a temporary file, which is kept in memory
+		only as long as it is smaller than IMPORT_SPOOL_MAX_BYTES.
+
+		Args:
+			chunks: The chunks of the request body
+
+		Returns:
+			upload: The temporary file, positioned at its start
+
+		Raises:
+			producer.exceptions.UploadTooLarge: When the upload exceeds IMPORT_MAX_BYTES
+	"""
+	loop = asyncio.get_event_loop()
+	upload = SpooledTemporaryFile(max_size=config.IMPORT_SPOOL_MAX_BYTES)
+
+	try:
+		size = 0
+		async for chunk in chunks:
+			size += len(chunk)
+			if size > config.IMPORT_MAX_BYTES:
+				raise UploadTooLarge(config.IMPORT_MAX_BYTES)
+
+			await loop.run_in_executor(None, upload.write, chunk)
+
+		await loop.run_in_executor(None, upload.seek, 0)
+	except BaseException:
+		upload.close()
+		raise
+
+	return upload
+
+
+async def import_references(
+	upload: BinaryIO,
+	db_client: DatabaseClient,
+	metadata: ReferenceMetadata,
+) -> AsyncIterator[dict]:
+	""" Imports the references of an ndjson upload, IMPORT_BATCH_SIZE
+		at a time, and yields a result for each line.
+
+		Blank lines are skipped. A line is either inserted, a duplicate
+		of an existing title (or of an earlier line), or invalid.
+
+		Args:
+			upload: The ndjson upload, i.e as returned by spool_upload
+			db_client: The database client to write to
+			metadata: The metadata of the imported references
+
+		Returns:
+			results: The result of each line
+	"""
+	loop = asyncio.get_event_loop()
+	batch = []
+	line_number = 0
+
+	while True:
+		lines = await loop.run_in_executor(None, read_lines, upload, config.IMPORT_BATCH_SIZE)
+		if not lines:
+			break
+
+		for line in lines:
+			line_number += 1
+			if not line.strip():
+				continue
+
+			try:
+				values = json.loads(line)
+				if not isinstance(values, dict):
+					raise ValueError("A reference must be a JSON object")
+
+				batch.append((line_number, Reference(**values)))
+			except ValueError as exc:
+				# Malformed json, json other than an object and ValidationError
+				batch.append((line_number, get_invalid_result(line_number, exc)))
+
+			if len(batch) >= config.IMPORT_BATCH_SIZE:
+				for result in await import_batch(batch, db_client, metadata):
+					yield result
+				batch = []
+
+	if batch:
+		for result in await import_batch(batch, db_client, metadata):
+			yield result
+
+
+def read_lines(upload: BinaryIO, count: int) -> List[bytes]:
+	""" Reads the next lines of an upload
+
+		Args:
+			upload: The ndjson upload
+			count: The maximum number of lines to read
+
+		Returns:
+			lines: The lines read, none once the upload has been read
+	"""
+	return list(islice(upload, count))
+
+
+async def import_batch(
+	batch: List[Tuple[int, Union[Reference, dict]]],
+	db_client: DatabaseClient,
+	metadata: ReferenceMetadata,
+) -> List[dict]:
+	""" Inserts the references of a batch of lines
+
+		Args:
+			batch: The line number and the reference (or the result, if invalid) of each line
+			db_client: The database client to write to
+			metadata: The metadata of the imported references
+
+		Returns:
+			results: The result of each line of the batch, in order
+	"""
+	references = [reference for _, reference in batch if isinstance(reference, Reference)]
+
+	reference_ids = iter(await db_client.insert_references(references, metadata))
+
+	results = []
+	for line_number, reference in batch:
+		if not isinstance(reference, Reference):
+			results.append(reference)
+			continue
+
+		reference_id = next(reference_ids)
+		if reference_id is None:
+			results.append(dict(line=line_number, status=DUPLICATE, title=reference.title))
+		else:
+			results.append(dict(line=line_number, status=INSERTED, reference_id=reference_id))
+
+	return results
+
+
+def get_invalid_result(line_number: int, exc: ValueError) -> dict:
+	""" Reports why a line is not a valid reference
+
+		Args:
+			line_number: The number of the line
+			exc: The error raised when parsing the line
+
+		Returns:
+			result: The result of the line
+	"""
+	if isinstance(exc, ValidationError):
+		errors = [
+			dict(loc=list(error["loc"]), msg=error["msg"])
+			for error in exc.errors()
+		]
+	else:
+		errors = [dict(loc=[], msg=str(exc))]
+
+	return dict(line=line_number, status=INVALID, errors=errors)
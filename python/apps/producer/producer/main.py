@@ -1,10 +1,12 @@
 import datetime
 import time
+from typing import Optional
 from uuid import uuid4
 
 from fastapi import (
 	Depends,
 	FastAPI,
+	Query,
 	Request,
 	status,
 )
@@ -18,18 +20,29 @@ from starlette.responses import (
 from sentry_sdk import capture_message
 
 from contextlog import contextlog
+from fastjson import (
+	FastJSONResponse,
+	ndjson_response,
+)
 from producer.auth import (
 	providers as auth_providers,
 	schemes as auth_schemes,
 	util as auth_util,
 )
 
+from producer import cache
 from producer import config
 from producer import db_client
+from producer.db_clients import hashing_executor
 from producer.exceptions import (
 	AuthorizationException,
-	DocumentExists,
 	exception_handling,
+	get_stream_error,
+	UnauthorizedUser,
+)
+from producer.imports import (
+	import_references,
+	spool_upload,
 )
 from producer.models.db_models import (
 	Category,
@@ -76,6 +89,7 @@ async def startup_event():
 
 	async with exception_handling():
 		await db_client.start_session()
+		await db_client.create_indexes()
 
 
 @app.on_event("shutdown")
@@ -87,6 +101,11 @@ async def shutdown_event():
 		await db_client.end_session()
 		await db_client.close_connection()
 
+		await cache.close_connection()
+		await auth_providers.close_http_client()
+
+	hashing_executor.shutdown(wait=False)
+
 
 @app.middleware("http")
 async def setup_request(request: Request, call_next) -> JSONResponse:
@@ -354,24 +373,34 @@ async def get_categories():
 
 @app.get("/get-references/")
 async def get_references(
+	cursor: Optional[str] = None,
+	page_size: int = Query(config.REFERENCES_PAGE_SIZE, gt=0, le=config.MAX_REFERENCES_PAGE_SIZE),
 	internal_user: InternalUser = Depends(access_token_cookie_scheme)
 ):
-	""" API endpoint for getting the references of a specific author
+	""" API endpoint for getting the references of a specific author,
+		one page at a time.
 
 		Args:
+			cursor: The nextCursor of the previous page, if any
+			page_size: The maximum number of references to return
 			internal_user: A user objects as defined in this application
 
 		Returns:
-			response: A JSON response including the references of the user
+			response: A JSON response including a page of the references of the user
 	"""
 	async with exception_handling():
 		if not internal_user.is_author:
 			raise UnauthorizedUser()
 
-		references = await db_client.find_by_author(internal_user.internal_sub_id)
+		reference_page = await db_client.find_by_author(
+			internal_user.internal_sub_id, page_size, cursor
+		)
 
-		response = JSONResponse(
-			content=jsonable_encoder({"references": references}),
+		response = FastJSONResponse(
+			content={
+				"references": reference_page.references,
+				"nextCursor": reference_page.next_cursor,
+			},
 		)
 
 		return response
@@ -420,14 +449,6 @@ async def insert_reference(
 		if not internal_user.is_author:
 			raise UnauthorizedUser()
 
-		title = reference.title
-		existing_references = await db_client.find_by_title(title)
-
-		if existing_references:
-			for ref in existing_references:
-				if title == ref.title:
-					raise DocumentExists(title)
-
 		# Inject metadata related to the reference
 		metadata = ReferenceMetadata(
 			created_at=datetime.datetime.now(),
@@ -443,6 +464,43 @@ async def insert_reference(
 		return response
 
 
+@app.put("/import-references/")
+async def import_references_endpoint(
+	request: Request,
+	internal_user: InternalUser = Depends(access_token_cookie_scheme)
+):
+	""" API endpoint for inserting references in bulk, out of an
+		ndjson upload with one reference per line.
+
+		Args:
+			request: The incoming request, with the ndjson upload as its body
+			internal_user: A user objects as defined in this application
+
+		Returns:
+			response: An ndjson response with the result of each line
+	"""
+	async with exception_handling():
+		if not internal_user.is_author:
+			raise UnauthorizedUser()
+
+		upload = await spool_upload(request.stream())
+
+		# Inject metadata related to the references
+		metadata = ReferenceMetadata(
+			created_at=datetime.datetime.now(),
+			author_id=internal_user.internal_sub_id,
+		)
+
+		async def results():
+			try:
+				async for result in import_references(upload, db_client, metadata):
+					yield result
+			finally:
+				upload.close()
+
+		return ndjson_response(results(), on_error=get_stream_error)
+
+
 @app.put("/edit-reference/")
 async def edit_reference(
 	reference: Reference,
@@ -586,21 +644,31 @@ async def delete_account(
 
 @app.get("/bookmark/")
 async def bookmark(
+	cursor: Optional[str] = None,
+	page_size: int = Query(config.REFERENCES_PAGE_SIZE, gt=0, le=config.MAX_REFERENCES_PAGE_SIZE),
 	internal_user: InternalUser = Depends(access_token_cookie_scheme)
 ):
-	""" API endpoint for returning the user's bookmarked references.
+	""" API endpoint for returning the user's bookmarked references,
+		one page at a time.
 
 		Args:
+			cursor: The nextCursor of the previous page, if any
+			page_size: The maximum number of references to return
 			internal_user: A user objects as defined in this application
 
 		Returns:
-			response: A JSON response with the bookmarked references
+			response: A JSON response with a page of the bookmarked references
 	"""
 	async with exception_handling():
-		references = await db_client.find_bookmarked_by_author(internal_user)
+		reference_page = await db_client.find_bookmarked_by_author(
+			internal_user, page_size, cursor
+		)
 
-		response = JSONResponse(
-			content=jsonable_encoder({"bookmarkedReferences": references}),
+		response = FastJSONResponse(
+			content={
+				"bookmarkedReferences": reference_page.references,
+				"nextCursor": reference_page.next_cursor,
+			},
 		)
 
 		return response
@@ -630,6 +698,44 @@ async def bookmark(
 		return response
 
 
+@app.put("/bookmarks/")
+async def bookmarks(
+	request: Request,
+	internal_user: InternalUser = Depends(access_token_cookie_scheme)
+):
+	""" API endpoint for bookmarking a list of references in one call.
+
+		Args:
+			request: The incoming request, with a list of reference_ids
+			internal_user: A user objects as defined in this application
+
+		Returns:
+			response: A JSON response with the status of the operation
+	"""
+	async with exception_handling():
+		request_arguments = await request.json()
+
+		reference_ids = request_arguments.get("reference_ids")
+
+		if not (
+			isinstance(reference_ids, list) and
+			0 < len(reference_ids) <= config.MAX_BULK_BOOKMARKS and
+			all(isinstance(reference_id, str) for reference_id in reference_ids)
+		):
+			logger.warning(f"Cannot bookmark references: reference_ids={reference_ids}")
+			return
+
+		modified_count = await db_client.add_bookmarks(reference_ids, internal_user)
+
+		success = True if modified_count else False
+
+		response = JSONResponse(
+			content=jsonable_encoder({"success": success}),
+		)
+
+		return response
+
+
 @app.delete("/bookmark/")
 async def bookmark(
 	request: Request,
@@ -20,3 +20,5 @@ class ExternalUser(BaseModel):
 	email: str
 	username: str
 	external_sub_id: str
+	# Set once the external_sub_id has been hashed, so that it is only hashed once
+	encrypted_external_sub_id: Optional[str]
@@ -62,6 +62,12 @@ class Reference(BaseModel):
 	rating: Optional[Rating]
 
 
+class ReferencePage(BaseModel):
+	""" A page of reference documents, along with the cursor of the next page """
+	references: List[dict]
+	next_cursor: Optional[str]
+
+
 class ReferenceMetadata(BaseModel):
 	""" Reference metadata """
 	created_at: datetime.datetime
@@ -0,0 +1,16 @@
+# contextlog expects logging.handlers to be imported already, as uvicorn does
+import logging.handlers
+import os
+
+
+# The configuration of the service is read from the environment on import
+for key, value in dict(
+	APP_NAME="producer",
+	LOCAL_DEPLOYMENT="true",
+	DATABASE_TYPE="mongodb",
+	DATABASE_HOST="localhost",
+	DATABASE_PORT="27017",
+	DATABASE_NAME="producer-tests",
+	HASHING_USE_PROCESSES="false",
+).items():
+	os.environ.setdefault(key, value)
@@ -0,0 +1,106 @@
+"""
+	Every cache client must behave the same, whether values are held in
+	process or in Redis.
+
+	Runs against the memory client and fakeredis. When TEST_REDIS_URL
+	points to a Redis server, also runs against it.
+"""
+import asyncio
+import os
+
+import fakeredis.aioredis
+import pytest
+
+from producer import cache_clients, config
+from producer.cache_clients import MemoryCacheClient, RedisCacheClient
+
+
+VALUE = {"internal_sub_id": "internal-1", "bookmarked_references": ["reference-1"]}
+
+
+def get_memory_client(monkeypatch):
+	return MemoryCacheClient()
+
+
+def get_fake_redis_client(monkeypatch):
+	monkeypatch.setattr(cache_clients.aioredis, "from_url", lambda url, **kwargs: fakeredis.aioredis.FakeRedis())
+
+	return RedisCacheClient()
+
+
+def get_redis_client(monkeypatch):
+	if not os.getenv("TEST_REDIS_URL"):
+		pytest.skip("TEST_REDIS_URL is not set")
+
+	monkeypatch.setattr(config, "REDIS_URL", os.environ["TEST_REDIS_URL"])
+
+	return RedisCacheClient()
+
+
+@pytest.fixture(params=[get_memory_client, get_fake_redis_client, get_redis_client], ids=["memory", "fakeredis", "redis"])
+def cache_client(request, monkeypatch):
+	return request.param(monkeypatch)
+
+
+def run(cache_client, coroutine):
+	async def run_and_close():
+		try:
+			await cache_client.delete("key")
+			return await coroutine
+		finally:
+			await cache_client.close_connection()
+
+	return asyncio.get_event_loop().run_until_complete(run_and_close())
+
+
+def test_values_are_set_and_got(cache_client):
+	async def check():
+		assert await cache_client.get("key") is None
+
+		await cache_client.set("key", VALUE, ttl=60)
+
+		assert await cache_client.get("key") == VALUE
+		# Getting a value keeps it
+		assert await cache_client.get("key") == VALUE
+
+		assert await cache_client.delete("key") == 1
+		assert await cache_client.get("key") is None
+		assert await cache_client.delete("key") == 0
+
+	run(cache_client, check())
+
+
+def test_values_expire(cache_client):
+	async def check():
+		await cache_client.set("key", VALUE, ttl=1)
+		assert await cache_client.get("key") == VALUE
+
+		await asyncio.sleep(1.5)
+
+		assert await cache_client.get("key") is None
+		assert await cache_client.pop("key") is None
+
+	run(cache_client, check())
+
+
+def test_pop_removes_the_value(cache_client):
+	async def check():
+		await cache_client.set("key", VALUE, ttl=60)
+
+		assert await cache_client.pop("key") == VALUE
+		assert await cache_client.get("key") is None
+		assert await cache_client.pop("key") is None
+
+	run(cache_client, check())
+
+
+def test_only_one_concurrent_pop_gets_the_value(cache_client):
+	async def check():
+		await cache_client.set("key", VALUE, ttl=60)
+
+		values = await asyncio.gather(*[cache_client.pop("key") for _ in range(10)])
+
+		assert values.count(VALUE) == 1
+		assert values.count(None) == 9
+
+	run(cache_client, check())
@@ -0,0 +1,122 @@
+"""
+	Concurrent ratings must keep the counters of a reference equal to
+	the ratings stored in the users' documents, and never negative.
+
+	Runs against mongomock, whose operations are made to yield to the
+	event loop so that concurrent ratings interleave. When TEST_MONGODB_URI
+	points to a replica set, also runs against it, with transactions.
+"""
+import asyncio
+import datetime
+import os
+import random
+
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+import pytest
+
+from producer import config, db_client
+from producer.models.db_models import InternalUser, RatingOptions
+
+
+REFERENCE_ID = "reference-1"
+USERS_COUNT = 20
+RATINGS_PER_USER = 10
+
+
+class YieldingCollection():
+	""" Yields to the event loop before every operation on a collection,
+		as a round trip to the database would.
+	"""
+	def __init__(self, collection):
+		self._collection = collection
+
+	def __getattr__(self, name):
+		attribute = getattr(self._collection, name)
+
+		if not asyncio.iscoroutinefunction(attribute):
+			return attribute
+
+		async def operation(*args, **kwargs):
+			await asyncio.sleep(0)
+			return await attribute(*args, **kwargs)
+
+		return operation
+
+
+def use_database(motor_client, yielding: bool):
+	db = motor_client[config.MONGODB_DATABASE]
+	references, users = db[config.MONGODB_REFERENCE_MANAGER_COLLECTION], db["users"]
+
+	if yielding:
+		references, users = YieldingCollection(references), YieldingCollection(users)
+
+	db_client._motor_client = motor_client
+	db_client._db = db
+	db_client._reference_manager_coll = references
+	db_client._users_coll = users
+
+
+def get_user(i: int, rated_references) -> dict:
+	return dict(
+		external_sub_id=f"external-{i}",
+		internal_sub_id=f"internal-{i}",
+		username=f"user-{i}",
+		is_author=False,
+		requested_join=False,
+		bookmarked_references=[],
+		rated_references=rated_references,
+		created_at=datetime.datetime.utcnow(),
+	)
+
+
+async def rate_concurrently(legacy_users: bool):
+	await db_client._reference_manager_coll.delete_many({})
+	await db_client._users_coll.delete_many({})
+
+	await db_client._reference_manager_coll.insert_one(
+		{"_id": REFERENCE_ID, "title": "A reference", "rating": {"positive": 0, "negative": 0}}
+	)
+	# Half of the users may still have the legacy list of rated references
+	users = [get_user(i, [] if legacy_users and i % 2 else {}) for i in range(USERS_COUNT)]
+	await db_client._users_coll.insert_many([dict(user) for user in users])
+
+	options = [RatingOptions.thumbs_up.value, RatingOptions.thumbs_down.value]
+	random.seed(0)
+
+	# Every rating starts from the user as it was before any of them, as
+	# when a user rates from several pages that have gone stale
+	await asyncio.gather(*[
+		db_client.rate_reference(REFERENCE_ID, random.choice(options), InternalUser(**user))
+		for user in users
+		for _ in range(RATINGS_PER_USER)
+	])
+
+	reference = await db_client._reference_manager_coll.find_one({"_id": REFERENCE_ID})
+
+	stored_options = []
+	async for user in db_client._users_coll.find({}):
+		stored_options.append((user["rated_references"] or {}).get(REFERENCE_ID))
+
+	assert reference["rating"]["positive"] >= 0
+	assert reference["rating"]["negative"] >= 0
+	assert reference["rating"]["positive"] == stored_options.count(RatingOptions.thumbs_up.value)
+	assert reference["rating"]["negative"] == stored_options.count(RatingOptions.thumbs_down.value)
+
+
+def test_concurrent_ratings_do_not_drift(monkeypatch):
+	monkeypatch.setattr(config, "MONGODB_USE_TRANSACTIONS", False)
+	monkeypatch.setattr(config, "RATING_MAX_ATTEMPTS", RATINGS_PER_USER * 2)
+	use_database(AsyncMongoMockClient(), yielding=True)
+
+	# mongomock does not fail updates of legacy lists with a WriteError
+	asyncio.get_event_loop().run_until_complete(rate_concurrently(legacy_users=False))
+
+
+@pytest.mark.skipif(not os.getenv("TEST_MONGODB_URI"), reason="TEST_MONGODB_URI is not set")
+def test_concurrent_ratings_do_not_drift_in_transactions(monkeypatch):
+	monkeypatch.setattr(config, "MONGODB_USE_TRANSACTIONS", True)
+	monkeypatch.setattr(config, "RATING_MAX_ATTEMPTS", RATINGS_PER_USER * 2)
+	use_database(AsyncIOMotorClient(os.environ["TEST_MONGODB_URI"]), yielding=False)
+
+	asyncio.get_event_loop().run_until_complete(rate_concurrently(legacy_users=True))
@@ -0,0 +1,94 @@
+"""
+	Titles of references must stay unique, whether or not the unique
+	title index could be created on the database.
+"""
+import asyncio
+import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+import pytest
+
+from producer import config, db_client
+from producer.exceptions import DocumentExists
+from producer.models.db_models import Reference, ReferenceMetadata
+
+
+DUPLICATE_TITLE = "A duplicated title"
+
+
+def use_database(motor_client):
+	db = motor_client[config.MONGODB_DATABASE]
+
+	db_client._motor_client = motor_client
+	db_client._db = db
+	db_client._reference_manager_coll = db[config.MONGODB_REFERENCE_MANAGER_COLLECTION]
+	db_client._users_coll = db["users"]
+
+
+def get_reference(title: str) -> Reference:
+	return Reference(
+		title=title,
+		category="arts",
+		description="A description of the reference",
+		books=[dict(name="A book", author="An author", book_sections=[dict(starting_page=1, ending_page=2)])],
+	)
+
+
+def get_metadata() -> ReferenceMetadata:
+	return ReferenceMetadata(created_at=datetime.datetime.utcnow(), author_id="internal-1")
+
+
+async def insert_duplicates():
+	for reference_id in ("reference-1", "reference-2"):
+		await db_client._reference_manager_coll.insert_one(
+			dict(get_reference(DUPLICATE_TITLE).dict(), _id=reference_id, reference_id=reference_id)
+		)
+
+
+async def check_titles_stay_unique():
+	with pytest.raises(DocumentExists):
+		await db_client.insert_reference(get_reference(DUPLICATE_TITLE), get_metadata())
+
+	reference = await db_client.insert_reference(get_reference("Another title"), get_metadata())
+
+	reference.title = DUPLICATE_TITLE
+	with pytest.raises(DocumentExists):
+		await db_client.update_reference(reference)
+
+	# A reference keeps its own title
+	reference.title = "Another title"
+	await db_client.update_reference(reference)
+
+	assert await db_client._reference_manager_coll.count_documents({"title": "Another title"}) == 1
+
+
+def test_titles_are_checked_without_the_unique_index():
+	use_database(AsyncMongoMockClient())
+
+	async def run():
+		await insert_duplicates()
+		# The unique title index cannot be built over the duplicates
+		await db_client.create_indexes()
+
+		assert "title_unique" not in await db_client._reference_manager_coll.index_information()
+
+		await check_titles_stay_unique()
+
+	asyncio.get_event_loop().run_until_complete(run())
+
+
+def test_titles_are_left_to_the_unique_index():
+	use_database(AsyncMongoMockClient())
+
+	async def run():
+		await insert_duplicates()
+		await db_client._reference_manager_coll.delete_one({"_id": "reference-2"})
+		await db_client.create_indexes()
+
+		# The writes are then rejected by MongoDB itself. Not exercised
+		# here, as mongomock-motor fails to raise DuplicateKeyError with
+		# the pymongo of the producer
+		assert "title_unique" in await db_client._reference_manager_coll.index_information()
+		assert db_client._unique_titles
+
+	asyncio.get_event_loop().run_until_complete(run())
@@ -0,0 +1,4 @@
+import os
+
+
+APP_NAME = os.getenv("APP_NAME")
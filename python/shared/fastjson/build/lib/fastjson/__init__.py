@@ -0,0 +1,8 @@
+from fastjson.responses import (
+	FastJSONResponse,
+	dumps,
+)
+from fastjson.streams import (
+	json_object_response,
+	ndjson_response,
+)
@@ -0,0 +1,94 @@
+"""
+	Streamed JSON responses, for content that is read from an
+	(async) iterator instead of being held in memory as a whole.
+
+	Items are serialized one at a time and sent in chunks of about
+	CHUNK_SIZE bytes, so that neither the full body nor every tiny
+	item becomes a separate write.
+"""
+from typing import Any, AsyncIterator
+
+from starlette.responses import StreamingResponse
+
+from fastjson.responses import dumps
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def iter_ndjson(items: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+	""" Serializes items as newline delimited JSON
+
+		Args:
+			items: The items to serialize
+
+		Returns:
+			chunks: The serialized items, in chunks
+	"""
+	chunk = bytearray()
+
+	async for item in items:
+		chunk += dumps(item)
+		chunk += b"\n"
+
+		if len(chunk) >= CHUNK_SIZE:
+			yield bytes(chunk)
+			chunk.clear()
+
+	if chunk:
+		yield bytes(chunk)
+
+
+async def iter_json_object(key: str, items: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+	""" Serializes items as a JSON object, with the items in an array
+		under the given key. i.e {"key": [item, item, ...]}
+
+		Args:
+			key: The key of the array
+			items: The items to serialize
+
+		Returns:
+			chunks: The serialized object, in chunks
+	"""
+	chunk = bytearray(b"{" + dumps(key) + b":[")
+
+	separator = b""
+	async for item in items:
+		chunk += separator
+		chunk += dumps(item)
+		separator = b","
+
+		if len(chunk) >= CHUNK_SIZE:
+			yield bytes(chunk)
+			chunk.clear()
+
+	chunk += b"]}"
+	yield bytes(chunk)
+
+
+def ndjson_response(items: AsyncIterator[Any]) -> StreamingResponse:
+	""" Streams items as newline delimited JSON
+
+		Args:
+			items: The items to stream
+
+		Returns:
+			response: A streaming response
+	"""
+	return StreamingResponse(iter_ndjson(items), media_type=NDJSON_MEDIA_TYPE)
+
+
+def json_object_response(key: str, items: AsyncIterator[Any]) -> StreamingResponse:
+	""" Streams items as an array under a key of a JSON object
+
+		Args:
+			key: The key of the array
+			items: The items to stream
+
+		Returns:
+			response: A streaming response
+	"""
+	return StreamingResponse(iter_json_object(key, items), media_type=JSON_MEDIA_TYPE)
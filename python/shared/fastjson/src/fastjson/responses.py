@@ -0,0 +1,53 @@
+"""
+	JSON responses serialized by orjson, in a single pass.
+
+	Unlike JSONResponse(content=jsonable_encoder(...)), the content is
+	not walked in Python first. orjson serializes datetimes, enums,
+	uuids and dataclasses natively, and pydantic models are turned
+	into dicts as they are met.
+"""
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+def encode_default(obj: Any) -> Any:
+	""" Encodes the objects that orjson does not support natively
+
+		Args:
+			obj: An object met during serialization
+
+		Returns:
+			value: A value that orjson can serialize
+
+		Raises:
+			TypeError
+	"""
+	if isinstance(obj, BaseModel):
+		return obj.dict()
+	if isinstance(obj, (set, frozenset)):
+		return list(obj)
+
+	raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+	""" Serializes content to JSON
+
+		Args:
+			content: The content to serialize
+
+		Returns:
+			data: The JSON encoded content
+	"""
+	return orjson.dumps(content, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+	""" A drop in replacement for JSONResponse, that also accepts
+		pydantic models, datetimes and enums in its content.
+	"""
+	def render(self, content: Any) -> bytes:
+		return dumps(content)
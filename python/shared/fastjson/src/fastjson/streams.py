@@ -0,0 +1,137 @@
+"""
+	Streamed JSON responses, for content that is read from an
+	(async) iterator instead of being held in memory as a whole.
+
+	Items are serialized one at a time and sent in chunks of about
+	CHUNK_SIZE bytes, so that neither the full body nor every tiny
+	item becomes a separate write.
+
+	The status of a streamed response is sent before its items are
+	read, so an error raised by the items is reported in the body
+	instead, as a final {"error": <message>} record. The message is
+	returned by the on_error handler of the response, which is also
+	where the error is logged.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Optional
+
+from starlette.responses import StreamingResponse
+
+from fastjson.responses import dumps
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+CHUNK_SIZE = 64 * 1024
+
+# Handles an error raised by the items of a stream, returning its message
+ErrorHandler = Callable[[Exception], str]
+
+
+async def iter_ndjson(
+	items: AsyncIterator[Any], on_error: Optional[ErrorHandler] = None
+) -> AsyncIterator[bytes]:
+	""" Serializes items as newline delimited JSON
+
+		Args:
+			items: The items to serialize
+			on_error: Handles an error raised by the items. Raised as is, if not given
+
+		Returns:
+			chunks: The serialized items, in chunks, followed by an error record if any
+	"""
+	chunk = bytearray()
+
+	try:
+		async for item in items:
+			chunk += dumps(item)
+			chunk += b"\n"
+
+			if len(chunk) >= CHUNK_SIZE:
+				yield bytes(chunk)
+				chunk.clear()
+	except asyncio.CancelledError:
+		raise
+	except Exception as exc:
+		if on_error is None:
+			raise
+
+		chunk += dumps({"error": on_error(exc)})
+		chunk += b"\n"
+
+	if chunk:
+		yield bytes(chunk)
+
+
+async def iter_json_object(
+	key: str, items: AsyncIterator[Any], on_error: Optional[ErrorHandler] = None
+) -> AsyncIterator[bytes]:
+	""" Serializes items as a JSON object, with the items in an array
+		under the given key. i.e {"key": [item, item, ...]}
+
+		An error is reported next to the array, i.e {"key": [...], "error": <message>}
+
+		Args:
+			key: The key of the array
+			items: The items to serialize
+			on_error: Handles an error raised by the items. Raised as is, if not given
+
+		Returns:
+			chunks: The serialized object, in chunks
+	"""
+	chunk = bytearray(b"{" + dumps(key) + b":[")
+	error = None
+
+	separator = b""
+	try:
+		async for item in items:
+			chunk += separator
+			chunk += dumps(item)
+			separator = b","
+
+			if len(chunk) >= CHUNK_SIZE:
+				yield bytes(chunk)
+				chunk.clear()
+	except asyncio.CancelledError:
+		raise
+	except Exception as exc:
+		if on_error is None:
+			raise
+
+		error = on_error(exc)
+
+	chunk += b"]"
+	if error is not None:
+		chunk += b"," + dumps("error") + b":" + dumps(error)
+	chunk += b"}"
+	yield bytes(chunk)
+
+
+def ndjson_response(items: AsyncIterator[Any], on_error: Optional[ErrorHandler] = None) -> StreamingResponse:
+	""" Streams items as newline delimited JSON
+
+		Args:
+			items: The items to stream
+			on_error: Handles an error raised by the items, if any
+
+		Returns:
+			response: A streaming response
+	"""
+	return StreamingResponse(iter_ndjson(items, on_error), media_type=NDJSON_MEDIA_TYPE)
+
+
+def json_object_response(
+	key: str, items: AsyncIterator[Any], on_error: Optional[ErrorHandler] = None
+) -> StreamingResponse:
+	""" Streams items as an array under a key of a JSON object
+
+		Args:
+			key: The key of the array
+			items: The items to stream
+			on_error: Handles an error raised by the items, if any
+
+		Returns:
+			response: A streaming response
+	"""
+	return StreamingResponse(iter_json_object(key, items, on_error), media_type=JSON_MEDIA_TYPE)
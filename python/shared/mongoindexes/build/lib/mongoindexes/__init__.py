@@ -0,0 +1,9 @@
+from mongoindexes.explain import (
+	HOT_QUERIES,
+	find_collection_scans,
+)
+from mongoindexes.indexes import (
+	INDEX_VERSIONS,
+	LATEST_VERSION,
+	ensure_indexes,
+)
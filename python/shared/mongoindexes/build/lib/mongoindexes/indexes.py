@@ -0,0 +1,151 @@
+"""
+	Indexes of the MongoDB collections, shared by all the services
+	that use the database.
+
+	Indexes are declared in versions. Each version is applied once,
+	in order, and the latest applied version is recorded in the
+	database. Never edit a version that has been released, append
+	a new one instead. An index that changes gets a new name, so that
+	it can be created before the old one is dropped.
+"""
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from contextlog import contextlog
+
+
+logger = contextlog.get_contextlog()
+
+REFERENCE_MANAGER_COLLECTION = "referencemanager"
+USERS_COLLECTION = "users"
+OPERATORS_COLLECTION = "operators"
+
+# Collection and document that record the latest applied version
+MIGRATIONS_COLLECTION = "migrations"
+INDEXES_MIGRATION_ID = "indexes"
+
+# MongoDB error code when dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
+INDEX_VERSIONS = [
+	dict(
+		version=1,
+		create={
+			REFERENCE_MANAGER_COLLECTION: [
+				# producer: DatabaseClient.find_by_title
+				IndexModel([("title", ASCENDING)], name="title"),
+				# producer: DatabaseClient.find_by_author
+				IndexModel(
+					[("metadata.author_id", ASCENDING), ("_id", ASCENDING)],
+					name="metadata.author_id_id",
+				),
+				# admin: DatabaseClient.get_references
+				IndexModel(
+					[("books.book_links.link_type", ASCENDING)],
+					name="books.book_links.link_type",
+				),
+			],
+			USERS_COLLECTION: [
+				# producer: DatabaseClient.get_user_by_external_sub_id
+				IndexModel([("external_sub_id", ASCENDING)], name="external_sub_id"),
+				# admin: DatabaseClient.get_user_by_id
+				IndexModel([("internal_sub_id", ASCENDING)], name="internal_sub_id"),
+			],
+			OPERATORS_COLLECTION: [
+				# admin: DatabaseClient.get_operator, DatabaseClient.get_operator_by_username
+				IndexModel([("username", ASCENDING)], name="username"),
+			],
+		},
+		drop={},
+	),
+	dict(
+		version=2,
+		create={
+			REFERENCE_MANAGER_COLLECTION: [
+				# producer: DatabaseClient.insert_reference, DatabaseClient.update_reference
+				# Rejects references with the title of an existing one
+				IndexModel([("title", ASCENDING)], name="title_unique", unique=True),
+			],
+		},
+		drop={
+			REFERENCE_MANAGER_COLLECTION: ["title"],
+		},
+	),
+]
+
+LATEST_VERSION = INDEX_VERSIONS[-1]["version"]
+
+
+async def ensure_indexes(db) -> int:
+	""" Applies the index versions that have not been applied
+		to the database yet, and records the latest one.
+
+		It is safe to call on every start of a service, from any
+		number of replicas at the same time. Creating an index that
+		already exists and dropping one that does not are no-ops.
+
+		Args:
+			db: A motor database
+
+		Returns:
+			version: The index version of the database
+	"""
+	migrations_coll = db[MIGRATIONS_COLLECTION]
+
+	migration = await migrations_coll.find_one({"_id": INDEXES_MIGRATION_ID})
+	applied_version = migration["version"] if migration else 0
+
+	if applied_version >= LATEST_VERSION:
+		return applied_version
+
+	for index_version in INDEX_VERSIONS:
+		if index_version["version"] <= applied_version:
+			continue
+
+		logger.info(f"Applying index version {index_version['version']}")
+
+		for collection, index_models in index_version["create"].items():
+			await db[collection].create_indexes(index_models)
+
+		for collection, index_names in index_version["drop"].items():
+			for index_name in index_names:
+				await drop_index(db[collection], index_name)
+
+	await record_version(migrations_coll, LATEST_VERSION)
+
+	return LATEST_VERSION
+
+
+async def drop_index(collection, index_name: str):
+	""" Drops an index, unless it has already been dropped
+
+		Args:
+			collection: A motor collection
+			index_name: The name of the index
+	"""
+	try:
+		await collection.drop_index(index_name)
+	except OperationFailure as exc:
+		if exc.code != INDEX_NOT_FOUND:
+			raise
+
+
+async def record_version(migrations_coll, version: int):
+	""" Records the index version of the database. Never moves
+		the version backwards, i.e when an older replica starts
+		after a newer one.
+
+		Args:
+			migrations_coll: The motor collection of the migrations
+			version: The applied index version
+	"""
+	update = dict(
+		filter={"_id": INDEXES_MIGRATION_ID},
+		update={"$max": {"version": version}},
+		upsert=True,
+	)
+	try:
+		await migrations_coll.update_one(**update)
+	except DuplicateKeyError:
+		# Lost the race to insert the document to another replica
+		await migrations_coll.update_one(**update)
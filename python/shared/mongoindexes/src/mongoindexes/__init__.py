@@ -0,0 +1,15 @@
+from mongoindexes.documents import (
+	get_projection,
+	hydrate,
+)
+from mongoindexes.explain import (
+	HOT_QUERIES,
+	find_collection_scans,
+)
+from mongoindexes.indexes import (
+	INDEX_VERSIONS,
+	LATEST_VERSION,
+	UNIQUE_TITLES_VERSION,
+	ensure_indexes,
+	get_version,
+)
@@ -0,0 +1,43 @@
+"""
+	Applies the indexes to a database and checks that none of the
+	hot queries falls back to a collection scan.
+
+	Exits with a non zero status when a query scans a collection.
+
+	Usage:
+		python -m mongoindexes --uri mongodb://localhost:27017 --database referencemanager
+"""
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from mongoindexes import ensure_indexes, find_collection_scans
+
+
+async def main(uri: str, database: str) -> int:
+	motor_client = AsyncIOMotorClient(uri)
+	try:
+		db = motor_client[database]
+
+		version = await ensure_indexes(db)
+		print(f"Index version {version}")
+
+		query_names = await find_collection_scans(db)
+	finally:
+		motor_client.close()
+
+	for query_name in query_names:
+		print(f"COLLSCAN: {query_name}")
+
+	return 1 if query_names else 0
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--uri", required=True, help="MongoDB connection string")
+	parser.add_argument("--database", required=True, help="MongoDB database name")
+	args = parser.parse_args()
+
+	sys.exit(asyncio.run(main(args.uri, args.database)))
@@ -0,0 +1,77 @@
+"""
+	Reading the documents of the MongoDB collections into the pydantic
+	models of the services.
+
+	Documents are fetched with a projection of the fields of their
+	model, and are only ever written out of validated models, so they
+	can be built into models again without validating them.
+"""
+from functools import lru_cache
+from typing import Dict, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+
+
+def get_projection(model: Type[BaseModel]) -> dict:
+	""" Builds a projection that fetches only the fields of a model,
+		leaving DB specific data (i.e _id, metadata) in the database.
+
+		Args:
+			model: The model that documents are read into
+
+		Returns:
+			projection: A MongoDB projection
+	"""
+	projection = {field: 1 for field in model.__fields__}
+	projection["_id"] = 0
+
+	return projection
+
+
+@lru_cache(maxsize=None)
+def get_nested_models(model: Type[BaseModel]) -> Dict[str, Tuple[Type[BaseModel], bool]]:
+	""" Finds the fields of a model that hold other models
+
+		Args:
+			model: A model
+
+		Returns:
+			nested_models: The model of each such field, and whether it holds a single one
+	"""
+	nested_models = {}
+	for name, field in model.__fields__.items():
+		if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+			nested_models[name] = (field.type_, field.shape == SHAPE_SINGLETON)
+
+	return nested_models
+
+
+def hydrate(model: Type[BaseModel], document: dict, trusted: bool = True) -> BaseModel:
+	""" Builds a model out of a document read from the database.
+		Trusted documents are not validated again, and neither are
+		their nested models.
+
+		Args:
+			model: The model to build
+			document: A document with the fields of the model
+			trusted: Whether the document was written by the services, i.e TRUSTED_READS
+
+		Returns:
+			instance: An instance of the model
+	"""
+	if not trusted:
+		return model(**document)
+
+	values = dict(document)
+	for name, (nested_model, is_single) in get_nested_models(model).items():
+		value = values.get(name)
+		if value is None:
+			continue
+
+		if is_single:
+			values[name] = hydrate(nested_model, value)
+		else:
+			values[name] = [hydrate(nested_model, item) for item in value]
+
+	return model.construct(**values)
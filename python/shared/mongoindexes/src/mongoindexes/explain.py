@@ -0,0 +1,110 @@
+"""
+	Checks that the hot queries of the services are served by an index.
+
+	Every query is run with explain() and reported when its winning
+	plan falls back to a collection scan.
+"""
+from typing import List
+
+from pymongo import ASCENDING
+
+from mongoindexes.indexes import (
+	OPERATORS_COLLECTION,
+	REFERENCE_MANAGER_COLLECTION,
+	USERS_COLLECTION,
+)
+
+
+# Collection scan stage of a query plan
+COLLSCAN = "COLLSCAN"
+
+# Representative values, the plans do not depend on them
+HOT_QUERIES = [
+	dict(
+		name="producer: find_by_author",
+		collection=REFERENCE_MANAGER_COLLECTION,
+		filter={"metadata.author_id": "internal_sub_id"},
+		sort=[("metadata.created_at", ASCENDING), ("_id", ASCENDING)],
+	),
+	dict(
+		name="producer: find_bookmarked_by_author",
+		collection=REFERENCE_MANAGER_COLLECTION,
+		filter={"_id": {"$in": ["reference_id"]}},
+		sort=[("metadata.created_at", ASCENDING), ("_id", ASCENDING)],
+	),
+	dict(
+		name="producer: insert_references",
+		collection=REFERENCE_MANAGER_COLLECTION,
+		filter={"title": {"$in": ["title"]}},
+	),
+	dict(
+		name="admin: get_references",
+		collection=REFERENCE_MANAGER_COLLECTION,
+		filter={"books.book_links.link_type": "amazon"},
+	),
+	dict(
+		name="producer: get_user_by_external_sub_id",
+		collection=USERS_COLLECTION,
+		filter={"external_sub_id": "external_sub_id"},
+	),
+	dict(
+		name="admin: get_user_by_id",
+		collection=USERS_COLLECTION,
+		filter={"internal_sub_id": "internal_sub_id"},
+	),
+	dict(
+		name="admin: get_operator",
+		collection=OPERATORS_COLLECTION,
+		filter={"username": "username", "password": "password"},
+	),
+]
+
+
+async def find_collection_scans(db) -> List[str]:
+	""" Explains each of the hot queries and returns the ones
+		that are planned as a collection scan.
+
+		Args:
+			db: A motor database
+
+		Returns:
+			query_names: The names of the queries that scan a collection
+	"""
+	query_names = []
+
+	for query in HOT_QUERIES:
+		cursor = db[query["collection"]].find(query["filter"])
+		if query.get("sort"):
+			cursor = cursor.sort(query["sort"])
+
+		explanation = await cursor.explain()
+
+		if COLLSCAN in plan_stages(explanation["queryPlanner"]["winningPlan"]):
+			query_names.append(query["name"])
+
+	return query_names
+
+
+def plan_stages(plan: dict) -> List[str]:
+	""" Collects the stages of a query plan, and of all its input plans
+
+		Args:
+			plan: A (winning) plan of an explain() output
+
+		Returns:
+			stages: The names of the stages in the plan
+	"""
+	stages = []
+
+	if "stage" in plan:
+		stages.append(plan["stage"])
+
+	# Plans of the slot based engine wrap the classic plan
+	if "queryPlan" in plan:
+		stages.extend(plan_stages(plan["queryPlan"]))
+	if "inputStage" in plan:
+		stages.extend(plan_stages(plan["inputStage"]))
+	for input_stage in plan.get("inputStages", []):
+		stages.extend(plan_stages(input_stage))
+
+	return stages
@@ -0,0 +1,280 @@
+"""
+	Indexes of the MongoDB collections, shared by all the services
+	that use the database.
+
+	Indexes are declared in versions. The versions are applied in
+	order, each against the indexes the database currently has, and
+	the latest applied version is recorded in the database. Never
+	edit a version that has been released, append a new one instead.
+	An index that changes gets a new name.
+
+	The indexes a version drops are dropped before the ones it creates,
+	since MongoDB rejects a second index on the same keys, i.e a unique
+	one next to a plain one. The documents are checked against every
+	unique index beforehand, so that a version that cannot be applied
+	fails before dropping anything.
+"""
+from typing import Set
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from contextlog import contextlog
+
+
+logger = contextlog.get_contextlog()
+
+REFERENCE_MANAGER_COLLECTION = "referencemanager"
+USERS_COLLECTION = "users"
+OPERATORS_COLLECTION = "operators"
+
+# Collection and document that record the latest applied version
+MIGRATIONS_COLLECTION = "migrations"
+INDEXES_MIGRATION_ID = "indexes"
+
+# MongoDB error code when dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
+# Number of duplicate values reported when a unique index cannot be created
+MAX_REPORTED_DUPLICATES = 5
+
+INDEX_VERSIONS = [
+	dict(
+		version=1,
+		create={
+			REFERENCE_MANAGER_COLLECTION: [
+				IndexModel([("title", ASCENDING)], name="title"),
+				# producer: DatabaseClient.find_by_author
+				IndexModel(
+					[("metadata.author_id", ASCENDING), ("_id", ASCENDING)],
+					name="metadata.author_id_id",
+				),
+				# admin: DatabaseClient.get_references
+				IndexModel(
+					[("books.book_links.link_type", ASCENDING)],
+					name="books.book_links.link_type",
+				),
+			],
+			USERS_COLLECTION: [
+				# producer: DatabaseClient.get_user_by_external_sub_id
+				IndexModel([("external_sub_id", ASCENDING)], name="external_sub_id"),
+				# admin: DatabaseClient.get_user_by_id
+				IndexModel([("internal_sub_id", ASCENDING)], name="internal_sub_id"),
+			],
+			OPERATORS_COLLECTION: [
+				# admin: DatabaseClient.get_operator, DatabaseClient.get_operator_by_username
+				IndexModel([("username", ASCENDING)], name="username"),
+			],
+		},
+		drop={},
+	),
+	dict(
+		version=2,
+		create={
+			REFERENCE_MANAGER_COLLECTION: [
+				# producer: DatabaseClient.insert_reference, DatabaseClient.update_reference
+				# Rejects references with the title of an existing one
+				IndexModel([("title", ASCENDING)], name="title_unique", unique=True),
+			],
+		},
+		drop={
+			REFERENCE_MANAGER_COLLECTION: ["title"],
+		},
+	),
+	dict(
+		version=3,
+		create={
+			REFERENCE_MANAGER_COLLECTION: [
+				# producer: DatabaseClient.find_by_author, pages in order of creation
+				IndexModel(
+					[("metadata.author_id", ASCENDING), ("metadata.created_at", ASCENDING), ("_id", ASCENDING)],
+					name="metadata.author_id_created_at_id",
+				),
+			],
+		},
+		drop={
+			REFERENCE_MANAGER_COLLECTION: ["metadata.author_id_id"],
+		},
+	),
+]
+
+LATEST_VERSION = INDEX_VERSIONS[-1]["version"]
+
+# Version as of which the titles of references are unique
+UNIQUE_TITLES_VERSION = 2
+
+
+async def ensure_indexes(db) -> int:
+	""" Applies the index versions that have not been applied
+		to the database yet, recording each one once applied.
+
+		It is safe to call on every start of a service, from any
+		number of replicas at the same time. Every version is applied
+		against the current indexes of the database, so replaying a
+		version that another replica has already applied is a no-op.
+
+		Args:
+			db: A motor database
+
+		Returns:
+			version: The index version of the database
+
+		Raises:
+			pymongo.errors.DuplicateKeyError: When documents share the values of a unique index
+			pymongo.errors.OperationFailure
+	"""
+	migrations_coll = db[MIGRATIONS_COLLECTION]
+
+	applied_version = await get_version(db)
+
+	if applied_version >= LATEST_VERSION:
+		return applied_version
+
+	for index_version in INDEX_VERSIONS:
+		if index_version["version"] <= applied_version:
+			continue
+
+		logger.info(f"Applying index version {index_version['version']}")
+
+		await apply_version(db, index_version)
+		await record_version(migrations_coll, index_version["version"])
+
+	return LATEST_VERSION
+
+
+async def get_version(db) -> int:
+	""" Returns the latest index version applied to the database
+
+		Args:
+			db: A motor database
+
+		Returns:
+			version: The index version of the database, 0 if none
+	"""
+	migration = await db[MIGRATIONS_COLLECTION].find_one({"_id": INDEXES_MIGRATION_ID})
+
+	return migration["version"] if migration else 0
+
+
+async def apply_version(db, index_version: dict):
+	""" Drops and creates the indexes of a version, skipping the ones
+		that have already been dropped or created. Indexes that a later
+		version drops are never created, so that a replica that lags
+		behind does not bring them back.
+
+		Args:
+			db: A motor database
+			index_version: One of INDEX_VERSIONS
+
+		Raises:
+			pymongo.errors.DuplicateKeyError: When documents share the values of a unique index
+			pymongo.errors.OperationFailure
+	"""
+	for collection, index_models in index_version["create"].items():
+		for index_model in index_models:
+			if index_model.document.get("unique"):
+				await check_unique_values(db[collection], index_model)
+
+	for collection, index_names in index_version["drop"].items():
+		existing_names = set(await db[collection].index_information())
+
+		for index_name in index_names:
+			if index_name in existing_names:
+				await drop_index(db[collection], index_name)
+
+	for collection, index_models in index_version["create"].items():
+		existing_names = set(await db[collection].index_information())
+		superseded_names = get_superseded_names(collection, index_version["version"])
+
+		index_models = [
+			index_model for index_model in index_models
+			if index_model.document["name"] not in existing_names | superseded_names
+		]
+		if index_models:
+			await db[collection].create_indexes(index_models)
+
+
+async def check_unique_values(collection, index_model: IndexModel):
+	""" Checks that no two documents share the values of the keys
+		of a unique index
+
+		Args:
+			collection: A motor collection
+			index_model: The unique index
+
+		Raises:
+			pymongo.errors.DuplicateKeyError
+	"""
+	keys = list(index_model.document["key"])
+
+	# Field names of the group cannot contain dots
+	group_id = {key.replace(".", "_"): f"${key}" for key in keys}
+
+	pipeline = [
+		{"$group": {"_id": group_id, "count": {"$sum": 1}}},
+		{"$match": {"count": {"$gt": 1}}},
+		{"$limit": MAX_REPORTED_DUPLICATES},
+	]
+	duplicates = [group["_id"] async for group in collection.aggregate(pipeline)]
+
+	if duplicates:
+		raise DuplicateKeyError(
+			f"Cannot create the unique index '{index_model.document['name']}' of "
+			f"'{collection.name}', documents share the values of {keys}: {duplicates}. "
+			"Resolve the duplicates and restart the service."
+		)
+
+
+def get_superseded_names(collection: str, version: int) -> Set[str]:
+	""" Returns the names of the indexes of a collection that are
+		dropped by the versions after the given one
+
+		Args:
+			collection: The name of the collection
+			version: The version the indexes are created by
+
+		Returns:
+			index_names: The names of the superseded indexes
+	"""
+	index_names = set()
+
+	for index_version in INDEX_VERSIONS:
+		if index_version["version"] > version:
+			index_names.update(index_version["drop"].get(collection, []))
+
+	return index_names
+
+
+async def drop_index(collection, index_name: str):
+	""" Drops an index, unless another replica has just dropped it
+
+		Args:
+			collection: A motor collection
+			index_name: The name of the index
+	"""
+	try:
+		await collection.drop_index(index_name)
+	except OperationFailure as exc:
+		if exc.code != INDEX_NOT_FOUND:
+			raise
+
+
+async def record_version(migrations_coll, version: int):
+	""" Records the index version of the database. Never moves
+		the version backwards, i.e when an older replica starts
+		after a newer one.
+
+		Args:
+			migrations_coll: The motor collection of the migrations
+			version: The applied index version
+	"""
+	update = dict(
+		filter={"_id": INDEXES_MIGRATION_ID},
+		update={"$max": {"version": version}},
+		upsert=True,
+	)
+	try:
+		await migrations_coll.update_one(**update)
+	except DuplicateKeyError:
+		# Lost the race to insert the document to another replica
+		await migrations_coll.update_one(**update)
@@ -35,6 +35,8 @@ class References extends Component {
 		title: null,
 		category: null,
 		description: null,
+		referencesCursor: null,
+		bookmarkedReferencesCursor: null,
 		referencesLoading: true,
 		bookmarkedReferencesLoading: true,
 		error: null
@@ -370,18 +372,37 @@ class References extends Component {
 		})
 	}
 
-	getReferences = () => {
+	fetchPage = (endpoint, request, cursor) => {
+		// The endpoints return one page at a time, along with the cursor of the next page
+		const url = cursor === null
+			? endpoint
+			: endpoint + (endpoint.includes('?') ? '&' : '?') + 'cursor=' + encodeURIComponent(cursor)
+
+		return fetch(url, request)
+		.then(response => response.json())
+	}
+
+	appendPage = (references, page) => {
+		// References added since the first page was loaded may be listed in the next ones
+		const referenceIds = new Set(references.map(reference => reference.reference_id))
+
+		return references.concat(page.filter(reference => !referenceIds.has(reference.reference_id)))
+	}
+
+	getReferences = (cursor = null) => {
 		const { t } = this.props
 		const referencesRequest = {
 			method: 'GET',
 			credentials: 'include',
 		}
 
-		fetch(this.state.producerReferencesEndpoint, referencesRequest)
-		.then(response => response.json())
+		this.fetchPage(this.state.producerReferencesEndpoint, referencesRequest, cursor)
 		.then(data => {
 			this.setState({
-				references: data['references'],
+				references: cursor === null
+					? data['references']
+					: this.appendPage(this.state.references, data['references']),
+				referencesCursor: data['nextCursor'],
 				referencesLoading: false
 			})
 		})
@@ -416,18 +437,20 @@ class References extends Component {
 		})
 	}
 
-	getBookmarkedReferences = () => {
+	getBookmarkedReferences = (cursor = null) => {
 		const { t } = this.props
 		const referencesRequest = {
 			method: 'GET',
 			credentials: 'include',
 		}
 
-		fetch(this.state.producerBookmarksEndpoint, referencesRequest)
-		.then(response => response.json())
+		this.fetchPage(this.state.producerBookmarksEndpoint, referencesRequest, cursor)
 		.then(data => {
 			this.setState({
-				bookmarkedReferences: data['bookmarkedReferences'],
+				bookmarkedReferences: cursor === null
+					? data['bookmarkedReferences']
+					: this.appendPage(this.state.bookmarkedReferences, data['bookmarkedReferences']),
+				bookmarkedReferencesCursor: data['nextCursor'],
 				bookmarkedReferencesLoading: false
 			})
 		})
@@ -615,6 +638,11 @@ class References extends Component {
 											))}
 										</ListGroup>
 									)}
+									{this.state.bookmarkedReferencesCursor ?
+										<Button variant="link" onClick={() => this.getBookmarkedReferences(this.state.bookmarkedReferencesCursor)}>
+											{t('references.loadmore')}
+										</Button> : null
+									}
 								</Col>
 							</Row>
 						</div>
@@ -698,6 +726,11 @@ class References extends Component {
 											))}
 										</ListGroup>
 									}
+									{this.state.referencesCursor ?
+										<Button variant="link" onClick={() => this.getReferences(this.state.referencesCursor)}>
+											{t('references.loadmore')}
+										</Button> : null
+									}
 								</Col>
 							</Row>
 						</div>